@@ -0,0 +1,231 @@
+import asyncio
+import time
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import Awaitable, Callable, Deque, Dict, TypeVar
+
+from config import (
+    LLM_MAX_CONCURRENCY,
+    LLM_MAX_QUEUE,
+    LLM_HEDGE,
+    LLM_HEDGE_PERCENTILE,
+    LLM_HEDGE_MIN_SAMPLES,
+    LLM_HEDGE_MIN_DELAY_MS,
+)
+
+T = TypeVar("T")
+
+
+class Deadline:
+    """
+    Time budget for one turn, measured on the monotonic clock.
+    """
+
+    def __init__(self, budget_seconds: float, started: float | None = None):
+        self.started = time.monotonic() if started is None else started
+        self.expires_at = self.started + budget_seconds
+
+    def remaining(self) -> float:
+        return max(0.0, self.expires_at - time.monotonic())
+
+    @property
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+
+class LatencyTracker:
+    """
+    Rolling window of recent call latencies (seconds).
+    """
+
+    def __init__(self, window: int = 200):
+        self._samples: Deque[float] = deque(maxlen=window)
+
+    def record(self, seconds: float) -> None:
+        self._samples.append(seconds)
+
+    def percentile(self, pct: float) -> float | None:
+        if not self._samples:
+            return None
+        ordered = sorted(self._samples)
+        index = min(len(ordered) - 1, int(round(pct / 100 * (len(ordered) - 1))))
+        return ordered[index]
+
+    def __len__(self) -> int:
+        return len(self._samples)
+
+
+class Shed(Exception):
+    """
+    Raised when a call is turned away instead of queued.
+    """
+
+    def __init__(self, reason: str):
+        super().__init__(reason)
+        self.reason = reason
+
+
+class LLMLimiter:
+    """
+    Bounded FIFO work queue in front of the LLM provider. At most
+    `max_concurrency` calls run at once and at most `max_queue` wait; anything
+    beyond that, or anything whose deadline would pass before a slot frees up
+    and the call completes, is shed so the caller can answer locally.
+    """
+
+    def __init__(self, max_concurrency: int, max_queue: int):
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_queue = max(0, max_queue)
+        self.latency = LatencyTracker()
+        self.in_flight = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self.counters: Dict[str, int] = {
+            "admitted": 0,
+            "completed": 0,
+            "failed": 0,
+            "shed_queue_full": 0,
+            "shed_deadline": 0,
+            "timed_out": 0,
+            "hedged": 0,
+            "hedge_won": 0,
+        }
+
+    def has_free_slot(self) -> bool:
+        return self.in_flight < self.max_concurrency and not self.queue_depth
+
+    @property
+    def queue_depth(self) -> int:
+        return sum(1 for waiter in self._waiters if not waiter.done())
+
+    def _shed(self, reason: str) -> Shed:
+        self.counters[f"shed_{reason}"] += 1
+        return Shed(reason)
+
+    def _release(self) -> None:
+        # Hand the slot straight to the oldest live waiter
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self.in_flight -= 1
+
+    async def _acquire(self, timeout: float | None) -> None:
+        if self.in_flight < self.max_concurrency and not self.queue_depth:
+            self.in_flight += 1
+            return
+        if self.queue_depth >= self.max_queue:
+            raise self._shed("queue_full")
+        if timeout is not None and timeout <= 0:
+            raise self._shed("deadline")
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(waiter, timeout)
+        except asyncio.TimeoutError:
+            raise self._shed("deadline")
+        except asyncio.CancelledError:
+            if waiter.done() and not waiter.cancelled():
+                self._release()
+            raise
+
+    @asynccontextmanager
+    async def admit(self, deadline: Deadline | None = None):
+        """
+        Holds an LLM slot for the duration of the block, or raises Shed.
+        """
+        # A free slot is always taken, so a stale latency estimate cannot shed
+        # every call; only time spent queueing is checked against the deadline.
+        timeout = None
+        if deadline is not None:
+            timeout = deadline.remaining() - (self.latency.percentile(50) or 0.0)
+        await self._acquire(timeout)
+        self.counters["admitted"] += 1
+        started = time.monotonic()
+        try:
+            yield
+        except asyncio.TimeoutError:
+            self.counters["timed_out"] += 1
+            raise
+        except asyncio.CancelledError:
+            # Losing hedges and abandoned requests are not provider failures
+            raise
+        except BaseException:
+            self.counters["failed"] += 1
+            raise
+        else:
+            self.counters["completed"] += 1
+            self.latency.record(time.monotonic() - started)
+        finally:
+            self._release()
+
+    async def _attempt(self, make_call: Callable[[float | None], Awaitable[T]], deadline: Deadline | None) -> T:
+        async with self.admit(deadline):
+            if deadline is None:
+                return await make_call(None)
+            # The budget goes to the client as its own timeout and is also
+            # enforced here, so the call is cancelled even if the client ignores it
+            remaining = deadline.remaining()
+            if remaining <= 0:
+                raise asyncio.TimeoutError()
+            return await asyncio.wait_for(make_call(remaining), remaining)
+
+    def _hedge_delay(self, deadline: Deadline | None) -> float | None:
+        if not LLM_HEDGE or deadline is None or len(self.latency) < LLM_HEDGE_MIN_SAMPLES:
+            return None
+        delay = max(LLM_HEDGE_MIN_DELAY_MS / 1000, self.latency.percentile(LLM_HEDGE_PERCENTILE) or 0.0)
+        # A backup that cannot finish inside the budget only adds load
+        if delay + (self.latency.percentile(50) or 0.0) >= deadline.remaining():
+            return None
+        return delay
+
+    async def call(self, make_call: Callable[[float | None], Awaitable[T]], deadline: Deadline | None = None) -> T:
+        """
+        Runs `make_call(timeout)` under admission control and the deadline.
+        With LLM_HEDGE on, a backup call is started if the first has not
+        answered after the recent p95 latency; the first success wins and the
+        other is cancelled. Raises Shed, asyncio.TimeoutError or the call's error.
+        """
+        primary = asyncio.ensure_future(self._attempt(make_call, deadline))
+        tasks = {primary}
+        try:
+            delay = self._hedge_delay(deadline)
+            if delay is not None:
+                await asyncio.wait(tasks, timeout=delay)
+                # Backups never queue; they only use a slot that is idle right now
+                if not primary.done() and self.has_free_slot():
+                    self.counters["hedged"] += 1
+                    tasks.add(asyncio.ensure_future(self._attempt(make_call, deadline)))
+            pending = set(tasks)
+            error: BaseException | None = None
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is not primary:
+                            self.counters["hedge_won"] += 1
+                        return task.result()
+                    # Prefer reporting the primary's failure
+                    if error is None or task is primary:
+                        error = task.exception()
+            raise error
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+
+    def metrics(self) -> Dict:
+        p50 = self.latency.percentile(50)
+        p95 = self.latency.percentile(95)
+        return {
+            "in_flight": self.in_flight,
+            "queue_depth": self.queue_depth,
+            "max_concurrency": self.max_concurrency,
+            "max_queue": self.max_queue,
+            "latency_p50_ms": round(p50 * 1000, 1) if p50 is not None else None,
+            "latency_p95_ms": round(p95 * 1000, 1) if p95 is not None else None,
+            **self.counters,
+        }
+
+
+LLM_LIMITER = LLMLimiter(LLM_MAX_CONCURRENCY, LLM_MAX_QUEUE)
@@ -1,15 +1,28 @@
-import json
+import asyncio
+import hashlib
 import logging
-import time
 import re
-from typing import Dict, Iterable, List
+from typing import AsyncIterator, Dict, List
 
-from groq import Groq
-from config import GROQ_API_KEY, GROQ_MODEL, MAX_CONTEXT_CHARS
-from extract_intel import extract_intel
-from bait_reply import bait_reply
+from groq import AsyncGroq
+from admission import LLM_LIMITER, Deadline, Shed
+from config import (
+    GROQ_API_KEY,
+    GROQ_MODEL,
+    MAX_CONTEXT_CHARS,
+    CONTEXT_TOKEN_BUDGET,
+    SUMMARY_MAX_CLAIMS,
+    SIMILARITY_REUSE_REPLY,
+)
+from extract_intel import extract_intel, extract_persona_facts, merge_intel
+from bait_reply import bait_reply, neutral_reply
+from envelope import EnvelopeParser, parse_envelope
+from similarity_cache import SIMILARITY_CACHE
+from prompt_cache import PROMPT_CACHE, prompt_key
+from keywords import scan as scan_keywords
 
 MODEL_NAME = GROQ_MODEL
+TEMPERATURE = 0.4
 SYSTEM_INSTRUCTION = (
     "MISSION: Detect scam intent and covertly extract actionable intelligence.\n"
     "PERSONA: You are the potential victim (the user), not the scammer. Sound natural, mildly innocent, and a bit cautious.\n"
@@ -24,38 +37,24 @@ SYSTEM_INSTRUCTION = (
     "OUTPUT: Return ONLY a valid JSON object with the specified keys. No extra text, no markdown, no role labels."
 )
 
-_client = Groq(api_key=GROQ_API_KEY)
+_client = AsyncGroq(api_key=GROQ_API_KEY)
 logger = logging.getLogger(__name__)
 
 def detect_scam(message: str) -> float:
     """Multi-signal analysis for scam detection."""
-    signals = [ "upi", "account", "bank", "verify", "verification",
-    "refund", "prize", "lottery", "offer", "limited",
-    "click", "link", "payment", "urgent", "kyc"]
     # Intent detection: Check for urgency + payment keywords
     confidence = 0.0
-    msg_lower = message.lower()
-    
-    if any(word in msg_lower for word in signals):
+    hits = scan_keywords(message)
+
+    if hits.has("scam_signal"):
         confidence += 0.5
-    if "urgent" in msg_lower or "now" in msg_lower:
+    if hits.has("scam_urgency"):
         confidence += 0.3
-    if "bank" in msg_lower or "upi" in msg_lower:
+    if hits.has("scam_payment"):
         confidence += 0.2
         
     return min(confidence, 1.0)
 
-def _extract_json(text: str) -> Dict | None:
-    cleaned = text.strip().replace("```json", "").replace("```", "")
-    start = cleaned.find("{")
-    end = cleaned.rfind("}")
-    if start == -1 or end == -1 or end <= start:
-        return None
-    try:
-        return json.loads(cleaned[start:end + 1])
-    except json.JSONDecodeError:
-        return None
-
 def _dedupe(items: List[str]) -> List[str]:
     seen = set()
     result: List[str] = []
@@ -66,30 +65,155 @@ def _dedupe(items: List[str]) -> List[str]:
         result.append(item)
     return result
 
-def _extract_intelligence(text: str) -> Dict[str, List[str]]:
-    return extract_intel(text)
+_CURSOR_SPAN = 3
+
+def _message_digest(message) -> str:
+    # Timestamps are left out: clients may resend history without stable ones
+    raw = f"{message.sender}\x00{message.text}"
+    return hashlib.blake2b(raw.encode("utf-8", "surrogatepass"), digest_size=6).hexdigest()
+
+def _cursor_at(history_items: list, index: int) -> str:
+    # Digests of the message at `index` and the two before it, so a repeated
+    # short message ("ok") does not match at the wrong place
+    return ".".join(_message_digest(m) for m in history_items[max(0, index - _CURSOR_SPAN + 1):index + 1])
+
+def _after_cursor(history_items: list, cursor: str | None) -> int:
+    # Index just past the message the cursor points at, or 0 if it is gone
+    if not cursor:
+        return 0
+    parts = cursor.split(".")
+    last = len(history_items) - 1
+    if len(parts) < _CURSOR_SPAN:
+        # Taken within the first messages, so it cannot have moved later
+        last = min(last, len(parts) - 1)
+    for index in range(last, -1, -1):
+        # Predecessors trimmed off the front of the history are not compared
+        window = history_items[max(0, index - len(parts) + 1):index + 1]
+        if [_message_digest(m) for m in window] == parts[len(parts) - len(window):]:
+            return index + 1
+    return 0
+
+def update_intel_state(state: Dict | None, history_items: list) -> Dict:
+    """
+    Incremental intel extraction for a session. The state remembers
+    the last scanned message; only messages after it are scanned and merged,
+    so the per-turn cost follows the new text rather than the whole history.
+    If the cursor is no longer in the history (client replaced it, or it was
+    trimmed away) everything is rescanned and merged into the existing state.
+    """
+    state = dict(state or {})
+    start = _after_cursor(history_items, state.get("cursor"))
+    new_items = history_items[start:]
+    if not new_items and "intel" in state:
+        return state
+
+    lines = [f"{m.sender}: {m.text}" if m.sender else m.text for m in new_items]
+    state["intel"] = merge_intel(state.get("intel"), extract_intel("\n".join(lines)))
+    # Persona facts are kept by the session store; drop the copy older states carried
+    state.pop("persona_facts", None)
+    if history_items:
+        state["cursor"] = _cursor_at(history_items, len(history_items) - 1)
+    return state
+
+_TOKEN_PIECES = re.compile(r"\w+|[^\w\s]")
+_SENTENCE_END = re.compile(r"(?<=[.!?])\s+")
+_SUMMARY_IDENTIFIERS = [
+    ("upi_ids", "UPI"),
+    ("bank_accounts", "bank a/c"),
+    ("ifsc_codes", "IFSC"),
+    ("phone_numbers", "phone"),
+    ("phishing_urls", "link"),
+]
+
+def count_tokens(text: str) -> int:
+    """
+    Tokenizer-free estimate: one token per punctuation mark and per four
+    characters of each word, close to BPE counts for English chat text.
+    """
+    return sum(1 if len(piece) <= 4 else (len(piece) + 3) // 4 for piece in _TOKEN_PIECES.findall(text or ""))
+
+def _format_line(message) -> str:
+    return f"{message.sender}: {message.text}" if message.sender else message.text
+
+def _recent_start(lines: List[str], budget: int, keep: int = 2) -> int:
+    # Index of the oldest line that still fits the budget (newest lines first)
+    used = 0
+    for index in range(len(lines) - 1, -1, -1):
+        used += count_tokens(lines[index])
+        if used > budget and index < len(lines) - keep:
+            return index + 1
+    return 0
+
+def _scammer_claims(lines: List[str]) -> List[str]:
+    claims: List[str] = []
+    for line in lines:
+        if not line.lower().startswith("scammer:"):
+            continue
+        for sentence in _SENTENCE_END.split(line.split(":", 1)[1].strip()):
+            if sentence and scan_keywords(sentence).has("claim_cue"):
+                claims.append(sentence[:160])
+    return claims
+
+def _summary_end(summary: Dict, history_items: list) -> int:
+    return _after_cursor(history_items, summary.get("cursor"))
 
-def extract_intelligence_from_history(history: List[str]) -> Dict[str, List[str]]:
-    return extract_intel("\n".join(history))
+def update_context_summary(state: Dict, history_items: list, budget: int = CONTEXT_TOKEN_BUDGET) -> Dict:
+    """
+    Folds turns that no longer fit the verbatim token budget into the
+    session's rolling summary. Like the intel cursor, the summary remembers
+    the last folded message, so each turn only folds what just fell out of
+    the window and the summary survives history trimming.
+    """
+    state = dict(state)
+    summary = dict(state.get("summary") or {"cursor": None, "folded": 0, "claims": []})
+    lines = [_format_line(m) for m in history_items]
+    folded_end = _summary_end(summary, history_items)
+    recent_start = max(folded_end, _recent_start(lines, budget))
+    if recent_start > folded_end:
+        claims = list(summary.get("claims") or [])
+        seen = {claim.lower() for claim in claims}
+        for claim in _scammer_claims(_sanitize_history(lines[folded_end:recent_start])):
+            if claim.lower() not in seen:
+                claims.append(claim)
+                seen.add(claim.lower())
+        summary["claims"] = claims[-SUMMARY_MAX_CLAIMS:] if SUMMARY_MAX_CLAIMS else []
+        summary["folded"] = int(summary.get("folded") or 0) + recent_start - folded_end
+        summary["cursor"] = _cursor_at(history_items, recent_start - 1)
+    state["summary"] = summary
+    return state
 
-def extract_persona_facts_from_history(history: List[str]) -> List[str]:
-    return _extract_persona_facts(history)
+def _summary_text(state: Dict, persona_facts: List[str] | None = None) -> str:
+    summary = state.get("summary") or {}
+    if not summary.get("folded"):
+        return ""
+    parts = [f"Earlier in this conversation ({summary['folded']} messages, summarized):"]
+    intel = state.get("intel") or {}
+    identifiers = [
+        f"{label}: {', '.join(intel[key][-5:])}"
+        for key, label in _SUMMARY_IDENTIFIERS
+        if intel.get(key)
+    ]
+    if identifiers:
+        parts.append("- Identifiers already shared: " + "; ".join(identifiers))
+    if persona_facts:
+        parts.append("- Persona facts: " + ", ".join(persona_facts))
+    if summary.get("claims"):
+        parts.append("- Scammer claims: " + " | ".join(summary["claims"]))
+    return "\n".join(parts)
+
+def build_context(state: Dict, history_items: list, persona_facts: List[str] | None = None) -> str:
+    """
+    Prompt context for a turn: the rolling summary plus the turns after it, verbatim.
+    """
+    recent = _sanitize_history([_format_line(m) for m in history_items[_summary_end(state.get("summary") or {}, history_items):]])
+    verbatim = "\n".join(recent)
+    if MAX_CONTEXT_CHARS and len(verbatim) > MAX_CONTEXT_CHARS:
+        verbatim = verbatim[-MAX_CONTEXT_CHARS:]
+    summary = _summary_text(state, persona_facts)
+    return f"{summary}\n\n{verbatim}" if summary else verbatim
 
 def _sanitize_history(history: List[str]) -> List[str]:
     # Strictly keep only plausible conversation lines; drop meta/instructional content
-    blocked_phrases = [
-        "the user wants",
-        "the instructions",
-        "output only",
-        "we need to output",
-        "the scenario",
-        "pre-configured",
-        "instruction says",
-        "the scammer must",
-        "final output",
-        "success!",
-        "honeypot testing completed",
-    ]
     allowed_prefixes = ("scammer:", "honeypot:", "user:", "assistant:")
     role_only = {"scammer", "honeypot", "user", "assistant"}
     cleaned: List[str] = []
@@ -104,7 +228,8 @@ def _sanitize_history(history: List[str]) -> List[str]:
             low = raw.lower()
             if not raw:
                 continue
-            if any(phrase in low for phrase in blocked_phrases):
+            hits = scan_keywords(raw)
+            if hits.has("meta_phrase"):
                 continue
             if low in role_only:
                 pending_role = low
@@ -114,7 +239,7 @@ def _sanitize_history(history: List[str]) -> List[str]:
                 pending_role = None
                 continue
             # If no prefix, drop obviously instructional lines
-            if any(tok in low for tok in ["must", "should", "instruction", "output", "json", "keys", "format"]):
+            if hits.has("instruction_token"):
                 continue
             if pending_role:
                 kept_lines.append(f"{pending_role.capitalize()}: {raw}")
@@ -144,7 +269,10 @@ def _normalize_model_json(parsed: Dict, fallback_intel: Dict[str, List[str]], co
     }
     parsed["extracted_intelligence"] = merged
     parsed["scam_detected"] = bool(parsed.get("scam_detected", confidence >= 0.5))
-    parsed["confidence_score"] = float(parsed.get("confidence_score", confidence))
+    try:
+        parsed["confidence_score"] = float(parsed.get("confidence_score", confidence))
+    except (TypeError, ValueError):
+        parsed["confidence_score"] = confidence
     parsed["agent_mode"] = parsed.get("agent_mode", "engaged" if confidence >= 0.5 else "monitoring")
     parsed["agent_reply"] = (parsed.get("agent_reply") or reply_fallback).strip()
     risk = parsed.get("risk_analysis") or {}
@@ -173,48 +301,15 @@ def _scammer_tone(history: List[str]) -> str:
             break
     if not last_scammer:
         return "neutral"
-    low = last_scammer.lower()
-    aggressive_markers = [
-        "urgent", "immediately", "now", "blocked", "suspended",
-        "legal action", "police", "fraud", "last chance",
-        "your account will", "final warning",
-    ]
     excessive_caps = sum(1 for c in last_scammer if c.isupper()) >= 10
     exclamations = last_scammer.count("!") >= 2
-    if any(m in low for m in aggressive_markers) or excessive_caps or exclamations:
+    if scan_keywords(last_scammer).has("aggressive") or excessive_caps or exclamations:
         return "aggressive"
     return "neutral"
 
 def _extract_persona_facts(history: List[str]) -> List[str]:
     # Lightweight consistency tracker based on prior self-references
-    facts: List[str] = []
-    patterns = [
-        r"\bmy (brother|sister|father|mother|husband|wife|son|daughter)\b",
-        r"\bi am (\d{2})\b",
-        r"\bi'm (\d{2})\b",
-        r"\bmy age is (\d{2})\b",
-        r"\bmy name is ([A-Z][a-z]+)\b",
-        r"\bi live in ([A-Z][a-zA-Z ]+)\b",
-        r"\bmy job is ([a-zA-Z ]+)\b",
-    ]
-    text = "\n".join(history)
-    for pat in patterns:
-        for match in re.findall(pat, text, flags=re.IGNORECASE):
-            if isinstance(match, tuple):
-                match = " ".join(match)
-            value = str(match).strip()
-            if value:
-                facts.append(value)
-    # Dedupe while preserving order
-    seen = set()
-    ordered: List[str] = []
-    for fact in facts:
-        key = fact.lower()
-        if key in seen:
-            continue
-        seen.add(key)
-        ordered.append(fact)
-    return ordered[:6]
+    return extract_persona_facts("\n".join(history))
 
 def _detect_repetition(history: List[str]) -> bool:
     # If the last two honeypot lines are nearly identical, flag repetition
@@ -225,8 +320,9 @@ def _detect_repetition(history: List[str]) -> bool:
     prev = recent[-2].lower()
     return last == prev or (len(last) > 0 and last in prev) or (len(prev) > 0 and prev in last)
 
-def _missing_intel(history: List[str]) -> List[str]:
-    intel = extract_intel("\n".join(history))
+def _missing_intel(history: List[str], intel: Dict[str, List[str]] | None = None) -> List[str]:
+    if intel is None:
+        intel = extract_intel("\n".join(history))
     missing = []
     if not intel.get("upi_ids"):
         missing.append("upi_id")
@@ -247,7 +343,7 @@ def estimate_confidence(history: List[str]) -> float:
 def generate_reply(history: List[str], scam_confidence: float = 0.0) -> str:
     if scam_confidence >= 0.6:
         return bait_reply(history)
-    return "I'm not sure. What exactly do you need me to do?"
+    return neutral_reply(history)
 
 def _build_prompt(history: List[str]) -> str:
     system_prompt = (
@@ -270,22 +366,70 @@ def _build_prompt(history: List[str]) -> str:
         full_prompt += "\n\nAsk for payment details politely."
     return full_prompt
 
-def generate_agent_response(history: List[str], persona_facts: List[str] | None = None) -> Dict:
+def _complete(messages: List[Dict], timeout: float | None, **kwargs):
+    # Only override the client's default timeout when there is a budget
+    if timeout is not None:
+        kwargs["timeout"] = timeout
+    return _client.chat.completions.create(model=MODEL_NAME, messages=messages, temperature=TEMPERATURE, **kwargs)
+
+async def _cached_completion(messages: List[Dict], deadline: Deadline | None) -> str:
     """
-    Acts as an autonomous AI Agent to covertly extract intelligence.
-    Returns the strict JSON format required by your objectives.
+    Raw model text for `messages`: from the exact-prompt cache, from an
+    identical call already in flight, or from a new call through the limiter.
+    """
+    async def call() -> str:
+        response = await LLM_LIMITER.call(lambda timeout: _complete(messages, timeout), deadline)
+        return (response.choices[0].message.content or "").strip()
+
+    timeout = deadline.remaining() if deadline is not None else None
+    return await PROMPT_CACHE.get_or_call(prompt_key(MODEL_NAME, TEMPERATURE, messages), call, timeout)
+
+def local_agent_response(
+    history: List[str],
+    intel: Dict[str, List[str]],
+    reasoning: str,
+    confidence: float | None = None,
+) -> Dict:
+    """
+    Fast path without the LLM: keyword confidence, canned/bait reply and the regex intel.
+    """
+    if confidence is None:
+        confidence = estimate_confidence(history)
+    return {
+        "scam_detected": confidence >= 0.5,
+        "confidence_score": confidence,
+        "agent_mode": "engaged" if confidence >= 0.5 else "monitoring",
+        "agent_reply": generate_reply(history, confidence),
+        "extracted_intelligence": intel,
+        "risk_analysis": {"exposure_risk": "low", "reasoning": reasoning}
+    }
+
+def _agent_messages(
+    history: List[str],
+    persona_facts: List[str] | None,
+    intel: Dict[str, List[str]] | None,
+    context: str | None = None,
+    reply_first: bool = False,
+) -> tuple:
+    """
+    Builds the JSON-envelope prompt. Returns (messages, sanitized_history, confidence, regex_intel).
     """
     sanitized_history = _sanitize_history(history)
-    context = "\n".join(sanitized_history)
-    if MAX_CONTEXT_CHARS and len(context) > MAX_CONTEXT_CHARS:
-        context = context[-MAX_CONTEXT_CHARS:]
+    if context is None:
+        # No session summary: keep as many recent turns as fit the token budget
+        recent = sanitized_history[_recent_start(sanitized_history, CONTEXT_TOKEN_BUDGET):]
+        context = "\n".join(recent)
+        if MAX_CONTEXT_CHARS and len(context) > MAX_CONTEXT_CHARS:
+            context = context[-MAX_CONTEXT_CHARS:]
 
-    persona_facts = persona_facts or _extract_persona_facts(sanitized_history)
+    if persona_facts is None:
+        # Only the honeypot's own lines describe its persona
+        persona_facts = _extract_persona_facts([h for h in sanitized_history if h.lower().startswith("honeypot:")])
     base_emotion = _emotional_state(sanitized_history)
     tone = _scammer_tone(sanitized_history)
     emotion = "stressed and confused" if tone == "aggressive" else base_emotion
     repeated = _detect_repetition(sanitized_history)
-    missing = _missing_intel(sanitized_history)
+    missing = _missing_intel(sanitized_history, intel)
 
     prompt = (
         "Conversation History:\n" + context + "\n\n"
@@ -304,93 +448,247 @@ def generate_agent_response(history: List[str], persona_facts: List[str] | None
         "- risk_analysis (object with suspicious_phrases: array of exact phrases used by the scammer in this session, and identifier_links: array of objects mapping identifier->url if mentioned together)\n"
         "Do NOT include analysis, role labels, or any extra text.\n"
     )
+    if reply_first:
+        # Lets the streaming endpoint start sending the reply before the analysis is written
+        prompt += "Write agent_reply as the first key of the object.\n"
     if len(history) > 3:
         prompt += "\nAsk for payment details politely."
 
     last_message = sanitized_history[-1] if sanitized_history else ""
     confidence = detect_scam(last_message)
-    regex_intel = _extract_intelligence(context)
+    regex_intel = intel if intel is not None else extract_intel("\n".join(sanitized_history))
+    messages = [
+        {"role": "system", "content": SYSTEM_INSTRUCTION},
+        {"role": "user", "content": prompt},
+    ]
+    return messages, sanitized_history, confidence, regex_intel
 
-    try:
-        response = _client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": SYSTEM_INSTRUCTION},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.4,
+def _opening_text(history: List[str]) -> str | None:
+    """
+    The session's first scammer message, if it is the one being answered.
+    Later turns depend on the conversation, so only openings are shared.
+    """
+    inbound = [line for line in history if not line.lower().startswith("honeypot:")]
+    if len(inbound) != 1:
+        return None
+    return inbound[0].split(":", 1)[1].strip() if ":" in inbound[0] else inbound[0]
+
+def _remember_classification(history: List[str], data: Dict) -> None:
+    # Session-specific fields (intel, identifier links) are not shared across sessions
+    opening = _opening_text(history)
+    if opening is None:
+        return
+    risk = data.get("risk_analysis") or {}
+    SIMILARITY_CACHE.put(opening, {
+        "scam_detected": data.get("scam_detected"),
+        "confidence_score": data.get("confidence_score"),
+        "agent_mode": data.get("agent_mode"),
+        "agent_reply": data.get("agent_reply"),
+        "suspicious_phrases": list(risk.get("suspicious_phrases") or []),
+    })
+
+def _cached_response(history: List[str], sanitized_history: List[str], regex_intel: Dict[str, List[str]]) -> Dict | None:
+    """
+    Builds a response from the classification of a near-duplicate opening
+    message another session already sent to the LLM, or returns None.
+    """
+    opening = _opening_text(history)
+    cached = SIMILARITY_CACHE.get(opening) if opening is not None else None
+    if cached is None:
+        return None
+    confidence = float(cached.get("confidence_score") or 0.0)
+    transcript = "\n".join(history).lower()
+    reply = cached.get("agent_reply") if SIMILARITY_REUSE_REPLY else None
+    return {
+        "scam_detected": bool(cached.get("scam_detected")),
+        "confidence_score": confidence,
+        "agent_mode": cached.get("agent_mode") or ("engaged" if confidence >= 0.5 else "monitoring"),
+        "agent_reply": reply or generate_reply(sanitized_history, confidence),
+        "extracted_intelligence": regex_intel,
+        "risk_analysis": {
+            "suspicious_phrases": [p for p in cached.get("suspicious_phrases", []) if p.lower() in transcript],
+            "identifier_links": [],
+            "reasoning": "Near-duplicate of an already classified message",
+        },
+    }
+
+def _response_from_text(
+    raw_text: str,
+    history: List[str],
+    sanitized_history: List[str],
+    confidence: float,
+    regex_intel: Dict[str, List[str]],
+    parsed: Dict | None = None,
+) -> Dict:
+    # Fenced, prefixed or truncated envelopes still parse; only plain text falls through
+    if parsed is None:
+        parsed = parse_envelope(raw_text)
+    if parsed is not None:
+        data = _normalize_model_json(
+            parsed,
+            fallback_intel=regex_intel,
+            confidence=confidence,
+            reply_fallback=generate_reply(sanitized_history, confidence),
         )
-        raw_text = (response.choices[0].message.content or "").strip()
-        parsed = _extract_json(raw_text)
-        if parsed:
-            return _normalize_model_json(
-                parsed,
-                fallback_intel=regex_intel,
-                confidence=confidence,
-                reply_fallback=generate_reply(sanitized_history, confidence),
-            )
-
-        return {
-            "scam_detected": confidence >= 0.5,
-            "confidence_score": confidence,
-            "agent_mode": "engaged" if confidence >= 0.5 else "monitoring",
-            "agent_reply": raw_text or generate_reply(history, confidence),
-            "extracted_intelligence": regex_intel,
-            "risk_analysis": {"exposure_risk": "low", "reasoning": "Model reply without JSON envelope"}
-        }
+        _remember_classification(history, data)
+        return data
+
+    return {
+        "scam_detected": confidence >= 0.5,
+        "confidence_score": confidence,
+        "agent_mode": "engaged" if confidence >= 0.5 else "monitoring",
+        "agent_reply": raw_text or generate_reply(history, confidence),
+        "extracted_intelligence": regex_intel,
+        "risk_analysis": {"exposure_risk": "low", "reasoning": "Model reply without JSON envelope"}
+    }
+
+async def generate_agent_response(
+    history: List[str],
+    persona_facts: List[str] | None = None,
+    intel: Dict[str, List[str]] | None = None,
+    deadline: Deadline | None = None,
+    context: str | None = None,
+) -> Dict:
+    """
+    Acts as an autonomous AI Agent to covertly extract intelligence.
+    Returns the strict JSON format required by your objectives.
+    Pass the session's incrementally extracted `intel` to skip rescanning the history.
+    The Groq call goes through the LLM admission queue and is bounded by
+    `deadline`; if it is shed or runs out of budget the local fast path answers.
+    `context` (from build_context) replaces the recent-turns window in the prompt.
+    Near-duplicates of messages the LLM already classified reuse that result.
+    """
+    messages, sanitized_history, confidence, regex_intel = _agent_messages(history, persona_facts, intel, context)
+    cached = _cached_response(history, sanitized_history, regex_intel)
+    if cached is not None:
+        return cached
+
+    try:
+        raw_text = await _cached_completion(messages, deadline)
+        return _response_from_text(raw_text, history, sanitized_history, confidence, regex_intel)
+    except Shed as exc:
+        logger.warning("LLM call shed (%s); answering locally", exc.reason)
+        return local_agent_response(history, regex_intel, f"LLM shed: {exc.reason}", confidence)
+    except asyncio.TimeoutError:
+        logger.warning("LLM call ran past the turn deadline; answering locally")
+        return local_agent_response(history, regex_intel, "LLM deadline exceeded", confidence)
     except Exception:
         logger.exception("Groq generate_content failed")
-        return {
-            "scam_detected": confidence >= 0.5,
-            "confidence_score": confidence,
-            "agent_mode": "engaged" if confidence >= 0.5 else "monitoring",
-            "agent_reply": generate_reply(history, confidence),
-            "extracted_intelligence": regex_intel,
-            "risk_analysis": {"exposure_risk": "low", "reasoning": "Groq API error"}
-        }
-
-def generate_agent_reply_stream(history: List[str]) -> Iterable[str]:
-    prompt = _build_prompt(history)
+        return local_agent_response(history, regex_intel, "Groq API error", confidence)
 
+async def stream_agent_response(
+    history: List[str],
+    persona_facts: List[str] | None = None,
+    intel: Dict[str, List[str]] | None = None,
+    deadline: Deadline | None = None,
+    context: str | None = None,
+) -> AsyncIterator[Dict]:
+    """
+    Streaming counterpart of generate_agent_response. Yields
+    {"type": "token", "text": ...} events for the reply as the model writes it,
+    {"type": "field", "key": ..., "value": ...} as other envelope keys complete,
+    then one {"type": "result", "data": ...} with the full normalized response.
+    """
+    messages, sanitized_history, confidence, regex_intel = _agent_messages(
+        history, persona_facts, intel, context, reply_first=True
+    )
+    cached = _cached_response(history, sanitized_history, regex_intel)
+    if cached is not None:
+        yield {"type": "token", "text": cached["agent_reply"]}
+        yield {"type": "result", "data": cached}
+        return
+
+    parser = EnvelopeParser()
+    raw_parts: List[str] = []
+    streamed: List[str] = []
+    async for chunk in generate_agent_reply_stream(history, deadline=deadline, messages=messages):
+        raw_parts.append(chunk)
+        for event in parser.feed(chunk):
+            if event[0] == "reply":
+                streamed.append(event[1])
+                yield {"type": "token", "text": event[1]}
+            elif event[1] != "agent_reply":
+                yield {"type": "field", "key": event[1], "value": event[2]}
+
+    data = _response_from_text(
+        "".join(raw_parts).strip(), history, sanitized_history, confidence, regex_intel, parsed=parser.close()
+    )
+    if not streamed and data.get("agent_reply"):
+        # No envelope to stream from (plain text or local fallback): send it whole
+        yield {"type": "token", "text": data["agent_reply"]}
+    elif streamed:
+        # Keep the result consistent with what the client already received
+        data["agent_reply"] = "".join(streamed).strip() or data["agent_reply"]
+    yield {"type": "result", "data": data}
+
+async def generate_agent_reply_stream(
+    history: List[str],
+    deadline: Deadline | None = None,
+    messages: List[Dict] | None = None,
+) -> AsyncIterator[str]:
+    """
+    Streams the model's raw text for `messages` (by default the plain-reply
+    prompt). A prompt answered before is replayed from the prompt cache.
+    Within `deadline`, a failed stream is retried once as a plain completion;
+    if the budget runs out before any text was sent, the local reply is
+    streamed instead.
+    """
+    if messages is None:
+        messages = [
+            {"role": "system", "content": SYSTEM_INSTRUCTION},
+            {"role": "user", "content": _build_prompt(history)},
+        ]
+
+    def remaining() -> float | None:
+        return deadline.remaining() if deadline is not None else None
+
+    key = prompt_key(MODEL_NAME, TEMPERATURE, messages)
+    cached = await PROMPT_CACHE.get(key)
+    if cached is not None:
+        yield cached
+        return
+
+    sent_any = False
     try:
-        stream = _client.chat.completions.create(
-            model=MODEL_NAME,
-            messages=[
-                {"role": "system", "content": SYSTEM_INSTRUCTION},
-                {"role": "user", "content": prompt},
-            ],
-            temperature=0.4,
-            stream=True,
-        )
-        for chunk in stream:
-            delta = chunk.choices[0].delta.content or ""
-            if delta:
-                yield delta
+        parts: List[str] = []
+        async with LLM_LIMITER.admit(deadline):
+            stream = await asyncio.wait_for(_complete(messages, remaining(), stream=True), remaining())
+            chunks = stream.__aiter__()
+            while True:
+                try:
+                    chunk = await asyncio.wait_for(chunks.__anext__(), remaining())
+                except StopAsyncIteration:
+                    break
+                delta = chunk.choices[0].delta.content or ""
+                if delta:
+                    sent_any = True
+                    parts.append(delta)
+                    yield delta
+        await PROMPT_CACHE.put(key, "".join(parts).strip())
         return
+    except Shed as exc:
+        logger.warning("LLM stream shed (%s); answering locally", exc.reason)
+    except asyncio.TimeoutError:
+        logger.warning("LLM stream ran past the turn deadline")
     except Exception:
         logger.exception("Groq streaming failed; falling back to non-stream.")
+        # Retry only if a typical call still fits in the budget
+        typical = LLM_LIMITER.latency.percentile(50) or 0.0
+        if not sent_any and (deadline is None or deadline.remaining() > typical):
+            try:
+                text = await _cached_completion(messages, deadline)
+                chunk_size = 40
+                for i in range(0, len(text), chunk_size):
+                    sent_any = True
+                    yield text[i:i + chunk_size]
+                if sent_any:
+                    return
+            except Shed as exc:
+                logger.warning("LLM retry shed (%s); answering locally", exc.reason)
+            except asyncio.TimeoutError:
+                logger.warning("LLM retry ran past the turn deadline")
+            except Exception:
+                logger.exception("Groq non-stream fallback failed.")
 
-    for attempt in range(2):
-        try:
-            response = _client.chat.completions.create(
-                model=MODEL_NAME,
-                messages=[
-                    {"role": "system", "content": SYSTEM_INSTRUCTION},
-                    {"role": "user", "content": prompt},
-                ],
-                temperature=0.4,
-            )
-            text = (response.choices[0].message.content or "").strip()
-            if not text:
-                return
-            chunk_size = 40
-            for i in range(0, len(text), chunk_size):
-                yield text[i:i + chunk_size]
-            return
-        except Exception as exc:
-            logger.exception("Groq non-stream fallback failed.")
-            if attempt == 0:
-                time.sleep(3)
-                continue
-            return
-
+    if not sent_any:
+        yield generate_reply(history, estimate_confidence(history))
@@ -10,3 +10,17 @@ def bait_reply(history: list):
         "I tried but it failed. Which UPI or bank should I use?"
     ]
     return random.choice(bait_prompts)
+
+
+def neutral_reply(history: list):
+    neutral_prompts = [
+        "I'm not sure. What exactly do you need me to do?",
+        "Sorry, who is this? I don't think I saved this number.",
+        "Hello? I didn't understand your message.",
+        "Yes? What is this regarding?",
+        "Sorry, I was busy. What did you want to tell me?",
+    ]
+    # Avoid sending the same line twice in a row
+    last_reply = next((line for line in reversed(history) if line.lower().startswith("honeypot:")), "")
+    choices = [p for p in neutral_prompts if p not in last_reply] or neutral_prompts
+    return random.choice(choices)
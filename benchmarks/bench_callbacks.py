@@ -0,0 +1,83 @@
+"""
+End-to-end callback throughput: outbox -> dispatcher -> local receiver.
+
+Queues synthetic final payloads, runs the dispatcher against the bundled
+callback_receiver app in-process and times until every session has arrived,
+once per request and once in bulk mode.
+
+    python benchmarks/bench_callbacks.py --sessions 2000 --latency-ms 20
+"""
+import argparse
+import asyncio
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import httpx
+
+import callback
+import callback_receiver
+from redis_store import outbox_add
+
+
+def _payload(i: int) -> dict:
+    return {
+        "sessionId": f"bench-cb-{i}",
+        "scamDetected": True,
+        "totalMessagesExchanged": 12,
+        "extractedIntelligence": {
+            "bankAccounts": ["123456789012"],
+            "upiIds": [f"refund{i}@ybl"],
+            "phishingLinks": [],
+            "phoneNumbers": ["+919876543210"],
+            "suspiciousKeywords": ["urgent", "kyc"],
+        },
+        "agentNotes": "Sophistication assessment: moderate (uses banking/payment identifiers).",
+    }
+
+
+async def _run(target: callback.CallbackTarget, sessions: int) -> tuple:
+    callback_receiver.reset()
+    for i in range(sessions):
+        await outbox_add(_payload(i))
+
+    transport = httpx.ASGITransport(app=callback_receiver.app)
+    started = time.perf_counter()
+    dispatcher = asyncio.create_task(callback.run_callback_dispatcher(poll_interval=0.05, target=target, transport=transport))
+    while callback_receiver.stats["sessions"] < sessions:
+        await asyncio.sleep(0.01)
+    elapsed = time.perf_counter() - started
+    dispatcher.cancel()
+    await asyncio.gather(dispatcher, return_exceptions=True)
+    return elapsed, callback_receiver.stats["requests"]
+
+
+async def _bench(sessions: int, bulk_size: int):
+    print(f"sessions={sessions} receiver_latency={callback_receiver.LATENCY_MS:.0f}ms concurrency={callback.CALLBACK_CONCURRENCY}")
+    print(f"{'mode':>10} {'requests':>9} {'elapsed_s':>10} {'sessions/s':>11}")
+    modes = [
+        ("single", callback.CallbackTarget("http://receiver/api/updateHoneyPotFinalResult")),
+        (f"bulk({bulk_size})", callback.CallbackTarget("http://receiver/api/updateHoneyPotFinalResults", bulk=True, batch_size=bulk_size)),
+    ]
+    for name, target in modes:
+        elapsed, requests = await _run(target, sessions)
+        print(f"{name:>10} {requests:>9} {elapsed:>10.2f} {sessions / elapsed:>11.1f}")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--sessions", type=int, default=2000, help="payloads to deliver per mode")
+    parser.add_argument("--latency-ms", type=float, default=20, help="receiver latency per request")
+    parser.add_argument("--bulk-size", type=int, default=50, help="sessions per bulk request")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    callback_receiver.LATENCY_MS = args.latency_ms
+    asyncio.run(_bench(args.sessions, args.bulk_size))
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,117 @@
+"""
+Concurrent throughput of the honeypot request path with a stubbed LLM.
+
+The Groq client is replaced by a stub that answers after a fixed latency, so
+the numbers only reflect how well a single worker overlaps requests.
+
+    python benchmarks/bench_concurrency.py --latency 0.5 --requests 64
+"""
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+os.environ.setdefault("HONEYPOT_API_KEY", "bench-key")
+os.environ.setdefault("GROQ_API_KEY", "bench-key")
+
+import httpx
+
+import agent
+import logger
+import main
+
+
+class _StubMessage:
+    def __init__(self, content: str):
+        self.content = content
+
+
+class _StubChoice:
+    def __init__(self, content: str):
+        self.message = _StubMessage(content)
+
+
+class _StubResponse:
+    def __init__(self, content: str):
+        self.choices = [_StubChoice(content)]
+
+
+class _StubCompletions:
+    def __init__(self, latency: float):
+        self.latency = latency
+
+    async def create(self, **kwargs):
+        await asyncio.sleep(self.latency)
+        return _StubResponse(json.dumps({
+            "scam_detected": False,
+            "confidence_score": 0.1,
+            "agent_mode": "monitoring",
+            "agent_reply": "Which branch is this from?",
+        }))
+
+
+class _StubChat:
+    def __init__(self, latency: float):
+        self.completions = _StubCompletions(latency)
+
+
+class _StubClient:
+    def __init__(self, latency: float):
+        self.chat = _StubChat(latency)
+
+
+async def _run(concurrency: int, total: int) -> float:
+    transport = httpx.ASGITransport(app=main.app)
+    semaphore = asyncio.Semaphore(concurrency)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench") as client:
+        async def one(i: int):
+            async with semaphore:
+                res = await client.post(
+                    "/honeypot/message",
+                    headers={"x-api-key": os.environ["HONEYPOT_API_KEY"]},
+                    json={
+                        "sessionId": f"bench-{concurrency}-{i}",
+                        "message": {"sender": "scammer", "text": "Hello, is this Ravi?", "timestamp": 0},
+                    },
+                )
+                res.raise_for_status()
+
+        started = time.perf_counter()
+        await asyncio.gather(*(one(i) for i in range(total)))
+        return time.perf_counter() - started
+
+
+async def _bench(levels: list, total: int, latency: float):
+    print(f"stub latency={latency:.3f}s requests/level={total}")
+    print(f"{'concurrency':>11} {'elapsed_s':>10} {'req/s':>8} {'speedup':>8}")
+    baseline = None
+    for level in levels:
+        elapsed = await _run(level, total)
+        rate = total / elapsed
+        baseline = baseline or rate
+        print(f"{level:>11} {elapsed:>10.2f} {rate:>8.1f} {rate / baseline:>7.1f}x")
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--latency", type=float, default=0.5, help="stub LLM latency in seconds")
+    parser.add_argument("--requests", type=int, default=64, help="requests per concurrency level")
+    parser.add_argument("--levels", default="1,4,16,64", help="comma-separated concurrency levels")
+    args = parser.parse_args()
+
+    logging.getLogger().setLevel(logging.WARNING)
+    agent._client = _StubClient(args.latency)
+    log_dir = tempfile.mkdtemp(prefix="honeypot-bench-")
+    logger.FILE_PATH = os.path.join(log_dir, "scam_logs.csv")
+
+    levels = [int(x) for x in args.levels.split(",") if x.strip()]
+    asyncio.run(_bench(levels, args.requests, args.latency))
+
+
+if __name__ == "__main__":
+    main_cli()
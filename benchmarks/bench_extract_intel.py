@@ -0,0 +1,130 @@
+"""
+Single-pass extract_intel scanner vs. the previous five-pass implementation.
+
+Generates synthetic scam transcripts of increasing length, times both
+extractors on the joined text and reports where their results differ.
+
+    python benchmarks/bench_extract_intel.py --turns 50,200,1000
+"""
+import argparse
+import os
+import random
+import re
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from extract_intel import (
+    _normalize_bank_account,
+    _normalize_ifsc,
+    _normalize_phone,
+    _normalize_upi,
+    extract_intel,
+)
+
+
+def legacy_extract_intel(text: str):
+    # Reference copy of the multi-pass implementation this scanner replaced
+    upi_pattern = r"\b[\w.-]+@[\w.-]+\b"
+    bank_pattern = r"\b(?:\d[ -]?){9,20}\b"
+    ifsc_pattern = r"\b[A-Z0-9][A-Z0-9\s-]{8,20}[A-Z0-9]\b"
+    url_pattern = r"https?://[^\s]+"
+    phone_pattern = r"\b(?:\+?91[-\s]?)?[6-9]\d{9}\b"
+
+    upis_raw = [u for u in re.findall(upi_pattern, text) if "http" not in u.lower()]
+    upis = {_normalize_upi(u) for u in upis_raw}
+
+    bank_accounts = set()
+    for candidate in re.findall(bank_pattern, text):
+        normalized = _normalize_bank_account(candidate)
+        if normalized:
+            bank_accounts.add(normalized)
+
+    ifsc_codes = set()
+    for candidate in re.findall(ifsc_pattern, text.upper()):
+        normalized = _normalize_ifsc(candidate)
+        if normalized:
+            ifsc_codes.add(normalized)
+
+    phone_numbers = set()
+    for raw in re.findall(phone_pattern, text):
+        normalized = _normalize_phone(raw)
+        if normalized:
+            phone_numbers.add(normalized)
+
+    return {
+        "upi_ids": sorted(upis),
+        "bank_accounts": sorted(bank_accounts),
+        "ifsc_codes": sorted(ifsc_codes),
+        "phishing_urls": sorted(set(re.findall(url_pattern, text))),
+        "phone_numbers": sorted(phone_numbers),
+        "wallet_addresses": []
+    }
+
+
+_FILLER = [
+    "Your account will be blocked today, act now.",
+    "Sir please verify your KYC immediately or face legal action.",
+    "I am calling from the bank head office, this is urgent.",
+    "I don't understand, which branch is this from?",
+    "Can you send the details again? My app is slow.",
+    "Do not share this with anyone, it is confidential.",
+]
+
+
+def _identifier(rng: random.Random) -> str:
+    kind = rng.randrange(5)
+    if kind == 0:
+        return f"Pay to {rng.choice(['refund', 'kyc.help', 'sbi-care'])}{rng.randrange(100)}@{rng.choice(['ybl', 'okaxis', 'paytm'])}"
+    if kind == 1:
+        digits = "".join(rng.choice("0123456789") for _ in range(rng.randrange(9, 17)))
+        return f"Account number {digits}"
+    if kind == 2:
+        return f"IFSC {rng.choice(['SBIN', 'HDFC', 'ICIC'])}0{rng.randrange(100000, 999999)}"
+    if kind == 3:
+        return f"Visit https://secure-{rng.randrange(1000)}.example/verify now"
+    return f"Call +91 {rng.choice('6789')}{rng.randrange(100000000, 999999999)}"
+
+
+def synthetic_transcript(turns: int, seed: int = 7) -> str:
+    rng = random.Random(seed)
+    lines = []
+    for i in range(turns):
+        sender = "scammer" if i % 2 == 0 else "honeypot"
+        text = rng.choice(_FILLER)
+        if sender == "scammer" and rng.random() < 0.4:
+            text = f"{text} {_identifier(rng)}"
+        lines.append(f"{sender}: {text}")
+    return "\n".join(lines)
+
+
+def _diff(old: dict, new: dict) -> dict:
+    result = {}
+    for key in old:
+        missing = sorted(set(old[key]) - set(new[key]))
+        added = sorted(set(new[key]) - set(old[key]))
+        if missing or added:
+            result[key] = {"only_legacy": missing, "only_scanner": added}
+    return result
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--turns", default="50,200,1000", help="comma-separated transcript lengths")
+    parser.add_argument("--repeat", type=int, default=20, help="timed runs per size")
+    args = parser.parse_args()
+
+    print(f"{'turns':>6} {'chars':>8} {'legacy_ms':>10} {'scanner_ms':>11} {'speedup':>8}")
+    for turns in [int(x) for x in args.turns.split(",") if x.strip()]:
+        text = synthetic_transcript(turns)
+        legacy = min(timeit.repeat(lambda: legacy_extract_intel(text), number=1, repeat=args.repeat))
+        scanner = min(timeit.repeat(lambda: extract_intel(text), number=1, repeat=args.repeat))
+        print(f"{turns:>6} {len(text):>8} {legacy * 1000:>10.2f} {scanner * 1000:>11.2f} {legacy / scanner:>7.1f}x")
+        diff = _diff(legacy_extract_intel(text), extract_intel(text))
+        if diff:
+            print(f"       differences: {diff}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,69 @@
+"""
+Stored-history codecs: the previous pydantic/JSON-object rows vs. compact
+JSON arrays and msgpack (when installed).
+
+Times encoding and decoding a session history of each size, plus building
+the "sender: text" prompt lines, and reports the bytes stored per message.
+
+    python benchmarks/bench_history_codec.py --messages 20,50,200
+"""
+import argparse
+import json
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import redis_store
+from schemas import HistoryMessage, MessageContent
+
+
+def synthetic_history(count: int):
+    messages = []
+    for index in range(count):
+        sender = "scammer" if index % 2 == 0 else "honeypot"
+        text = f"Sir your account {index} is blocked, pay Rs {index * 10} to verify@ybl immediately"
+        messages.append(HistoryMessage(sender, text, 1700000000000 + index))
+    return messages
+
+
+def legacy_roundtrip(messages):
+    # Reference copy of the pydantic path this codec replaced
+    rows = [json.dumps(MessageContent(sender=m.sender, text=m.text, timestamp=m.timestamp).model_dump()) for m in messages]
+    decoded = [MessageContent(**json.loads(row)) for row in rows]
+    return rows, [f"{m.sender}: {m.text}" if m.sender else m.text for m in decoded]
+
+
+def compact_roundtrip(messages):
+    rows = [redis_store._encode(m) for m in messages]
+    decoded = redis_store._decode_history(rows)
+    return rows, [m.line for m in decoded]
+
+
+def main_cli():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--messages", default="20,50,200", help="comma-separated history lengths")
+    parser.add_argument("--repeat", type=int, default=50, help="timed runs per size")
+    args = parser.parse_args()
+
+    codecs = ["json"] + (["msgpack"] if redis_store.msgpack is not None else [])
+
+    print(f"{'messages':>8} {'codec':>8} {'ms':>8} {'bytes/msg':>10} {'speedup':>8}")
+    for count in [int(x) for x in args.messages.split(",") if x.strip()]:
+        messages = synthetic_history(count)
+        legacy = min(timeit.repeat(lambda: legacy_roundtrip(messages), number=1, repeat=args.repeat))
+        rows, _ = legacy_roundtrip(messages)
+        size = sum(len(row.encode("utf-8")) for row in rows) / count
+        print(f"{count:>8} {'pydantic':>8} {legacy * 1000:>8.3f} {size:>10.1f} {'':>8}")
+        for codec in codecs:
+            redis_store._CODEC = codec
+            elapsed = min(timeit.repeat(lambda: compact_roundtrip(messages), number=1, repeat=args.repeat))
+            rows, lines = compact_roundtrip(messages)
+            assert lines == legacy_roundtrip(messages)[1]
+            size = sum(len(row if isinstance(row, bytes) else row.encode("utf-8")) for row in rows) / count
+            print(f"{count:>8} {codec:>8} {elapsed * 1000:>8.3f} {size:>10.1f} {legacy / elapsed:>7.1f}x")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -1,38 +1,37 @@
+import asyncio
 import logging
+import os
+import random
+import socket
 
-import requests
+import httpx
 
+from config import (
+    CALLBACK_TIMEOUT_SECONDS,
+    CALLBACK_MAX_ATTEMPTS,
+    CALLBACK_BACKOFF_BASE_SECONDS,
+    CALLBACK_BACKOFF_MAX_SECONDS,
+    CALLBACK_CONCURRENCY,
+    CALLBACK_URL,
+    CALLBACK_BULK_URL,
+    CALLBACK_BULK_MAX,
+)
+from keywords import KEYWORD_CATEGORIES, KeywordHits, scan as scan_keywords
 from logger import log_summary_event
+from redis_store import outbox_add, outbox_read, outbox_ack, outbox_dead_letter, outbox_requeue, outbox_spill
 
-SUSPICIOUS_KEYWORDS = [
-    "urgent",
-    "verify",
-    "verification",
-    "account blocked",
-    "account suspended",
-    "kyc",
-    "click",
-    "link",
-    "payment",
-    "upi",
-    "bank",
-    "refund",
-]
-
-def _extract_suspicious_keywords(history_text: str):
-    lowered = history_text.lower()
-    found = []
-    for kw in SUSPICIOUS_KEYWORDS:
-        if kw in lowered:
-            found.append(kw)
-    return found
-
-def _assess_sophistication(history_text: str, intelligence: dict) -> str:
-    lowered = history_text.lower()
+SUSPICIOUS_KEYWORDS = KEYWORD_CATEGORIES["suspicious"]
+_CONSUMER = f"{socket.gethostname()}-{os.getpid()}"
+_wakeup: asyncio.Event | None = None
+
+def _extract_suspicious_keywords(hits: KeywordHits):
+    return hits.keywords("suspicious")
+
+def _assess_sophistication(hits: KeywordHits, intelligence: dict) -> str:
     has_link = bool(intelligence.get("phishing_urls"))
     has_payment_ids = bool(intelligence.get("bank_accounts") or intelligence.get("upi_ids") or intelligence.get("phone_numbers"))
-    has_banking_terms = any(term in lowered for term in ["kyc", "ifsc", "otp", "account", "bank", "verification"])
-    urgency = any(term in lowered for term in ["urgent", "immediately", "blocked", "suspended", "2 hours", "limited time"])
+    has_banking_terms = hits.has("banking_term")
+    urgency = hits.has("urgency_term")
 
     if has_link and has_payment_ids and has_banking_terms:
         return "high (uses links plus banking/payment identifiers)"
@@ -42,9 +41,9 @@ def _assess_sophistication(history_text: str, intelligence: dict) -> str:
         return "low-to-moderate (urgency and verification cues)"
     return "low (generic pressure without specific identifiers)"
 
-def _build_agent_notes(history_text: str, intelligence: dict, risk_analysis: dict | None) -> str:
-    keywords = _extract_suspicious_keywords(history_text)
-    sophistication = _assess_sophistication(history_text, intelligence)
+def _build_agent_notes(hits: KeywordHits, intelligence: dict, risk_analysis: dict | None) -> str:
+    keywords = _extract_suspicious_keywords(hits)
+    sophistication = _assess_sophistication(hits, intelligence)
     suspicious_phrases = []
     identifier_links = []
     if isinstance(risk_analysis, dict):
@@ -68,10 +67,11 @@ def _build_agent_notes(history_text: str, intelligence: dict, risk_analysis: dic
     parts.append(f"Sophistication assessment: {sophistication}.")
     return " ".join(parts)
 
-def send_final_callback(session_id, history, intelligence, notes=None, risk_analysis=None):
-    history_text = "\n".join(history)
-    agent_notes = notes or _build_agent_notes(history_text, intelligence, risk_analysis)
-    sophistication = _assess_sophistication(history_text, intelligence)
+def build_final_payload(session_id, history, intelligence, notes=None, risk_analysis=None) -> dict:
+    # One keyword pass over the transcript feeds the notes, keywords and sophistication
+    hits = scan_keywords("\n".join(history))
+    agent_notes = notes or _build_agent_notes(hits, intelligence, risk_analysis)
+    sophistication = _assess_sophistication(hits, intelligence)
     payload = {
         "sessionId": session_id,
         "scamDetected": True,
@@ -81,7 +81,7 @@ def send_final_callback(session_id, history, intelligence, notes=None, risk_anal
             "upiIds": intelligence.get("upi_ids", []),
             "phishingLinks": intelligence.get("phishing_urls", []),
             "phoneNumbers": intelligence.get("phone_numbers", []),
-            "suspiciousKeywords": _extract_suspicious_keywords(history_text),
+            "suspiciousKeywords": _extract_suspicious_keywords(hits),
         },
         "agentNotes": agent_notes
     }
@@ -96,10 +96,121 @@ def send_final_callback(session_id, history, intelligence, notes=None, risk_anal
         suspicious_phrases=suspicious_phrases,
         sophistication=sophistication,
     )
-    
-    try:
-        url = "https://hackathon.guvi.in/api/updateHoneyPotFinalResult"
-        res = requests.post(url, json=payload, timeout=10)
-        logging.info(f"Callback Status: {res.status_code}")
-    except Exception as e:
-        logging.error(f"Callback Failed: {e}")
+    return payload
+
+async def enqueue_final_callback(session_id, history, intelligence, notes=None, risk_analysis=None):
+    """
+    Builds the final payload and hands it to the outbox; delivery happens in
+    the background dispatcher, never on the request path.
+    """
+    payload = build_final_payload(session_id, history, intelligence, notes, risk_analysis)
+    await outbox_add(payload)
+    if _wakeup is not None:
+        _wakeup.set()
+
+class CallbackTarget:
+    """
+    Where final payloads are posted. In bulk mode one request carries up to
+    `batch_size` session summaries as {"results": [...]}.
+    """
+
+    def __init__(self, url: str, bulk: bool = False, batch_size: int = 1):
+        self.url = url
+        self.bulk = bulk
+        self.batch_size = max(1, batch_size) if bulk else 1
+
+    def body(self, payloads: list) -> dict:
+        return {"results": payloads} if self.bulk else payloads[0]
+
+def callback_target() -> CallbackTarget:
+    if CALLBACK_BULK_URL:
+        return CallbackTarget(CALLBACK_BULK_URL, bulk=True, batch_size=CALLBACK_BULK_MAX)
+    return CallbackTarget(CALLBACK_URL)
+
+def _backoff(attempt: int) -> float:
+    # Full jitter keeps retries from many sessions from lining up
+    ceiling = min(CALLBACK_BACKOFF_MAX_SECONDS, CALLBACK_BACKOFF_BASE_SECONDS * (2 ** (attempt - 1)))
+    return random.uniform(0, ceiling)
+
+async def _deliver(client: httpx.AsyncClient, target: CallbackTarget, batch: list) -> None:
+    payloads = [payload for _, payload in batch]
+    sessions = ", ".join(str(p.get("sessionId")) for p in payloads)
+    error = ""
+    for attempt in range(1, CALLBACK_MAX_ATTEMPTS + 1):
+        try:
+            res = await client.post(target.url, json=target.body(payloads))
+            logging.info("Callback Status: %s (sessions %s)", res.status_code, sessions)
+            # 4xx other than throttling will not get better on retry
+            if res.status_code < 500 and res.status_code not in (408, 429):
+                for entry_id, _ in batch:
+                    await outbox_ack(entry_id)
+                return
+            error = f"HTTP {res.status_code}"
+        except httpx.HTTPError as e:
+            error = f"{type(e).__name__}: {e}"
+        if attempt < CALLBACK_MAX_ATTEMPTS:
+            logging.warning("Callback attempt %s failed (%s); retrying", attempt, error)
+            await asyncio.sleep(_backoff(attempt))
+    logging.error("Callback Failed after %s attempts: %s", CALLBACK_MAX_ATTEMPTS, error)
+    for entry_id, payload in batch:
+        await outbox_dead_letter(entry_id, payload, error)
+
+async def run_callback_dispatcher(
+    poll_interval: float = 1.0,
+    target: CallbackTarget | None = None,
+    transport: httpx.AsyncBaseTransport | None = None,
+) -> None:
+    """
+    Drains the outbox with a pooled HTTP client, at most CALLBACK_CONCURRENCY
+    requests in flight. `transport` lets benchmarks post to an in-process receiver.
+    """
+    global _wakeup
+    _wakeup = asyncio.Event()
+    target = target or callback_target()
+    limits = httpx.Limits(max_connections=CALLBACK_CONCURRENCY, max_keepalive_connections=CALLBACK_CONCURRENCY)
+    slots = asyncio.Semaphore(CALLBACK_CONCURRENCY)
+    in_flight: set[asyncio.Task] = set()
+
+    async def deliver(client, batch):
+        try:
+            await _deliver(client, target, batch)
+        except BaseException as exc:
+            # Memory-queued entries were popped, not leased like stream
+            # entries: unless acked or dead-lettered they go back to the queue
+            outbox_requeue([payload for entry_id, payload in batch if entry_id is None])
+            if not isinstance(exc, Exception):
+                raise
+            logging.exception("Callback dispatcher error")
+        finally:
+            slots.release()
+            if _wakeup is not None:
+                _wakeup.set()
+
+    async with httpx.AsyncClient(timeout=CALLBACK_TIMEOUT_SECONDS, limits=limits, transport=transport) as client:
+        try:
+            while True:
+                free = CALLBACK_CONCURRENCY - len(in_flight)
+                entries = await outbox_read(_CONSUMER, count=free * target.batch_size) if free > 0 else []
+                for start in range(0, len(entries), target.batch_size):
+                    await slots.acquire()
+                    task = asyncio.create_task(deliver(client, entries[start:start + target.batch_size]))
+                    in_flight.add(task)
+                    task.add_done_callback(in_flight.discard)
+                if entries:
+                    continue
+                _wakeup.clear()
+                try:
+                    await asyncio.wait_for(_wakeup.wait(), timeout=poll_interval)
+                except asyncio.TimeoutError:
+                    pass
+        finally:
+            # Unfinished deliveries stay pending in the stream and are reclaimed
+            # later; memory-queued ones are requeued and handed to Redis if it is up
+            for task in in_flight:
+                task.cancel()
+            await asyncio.gather(*in_flight, return_exceptions=True)
+            _wakeup = None
+            try:
+                await outbox_spill()
+            except Exception:
+                logging.exception("Could not move queued callbacks to Redis")
@@ -0,0 +1,63 @@
+"""
+Local stand-in for the final-result endpoint, for offline load tests.
+
+    uvicorn callback_receiver:app --port 9000
+    CALLBACK_URL=http://127.0.0.1:9000/api/updateHoneyPotFinalResult
+    CALLBACK_BULK_URL=http://127.0.0.1:9000/api/updateHoneyPotFinalResults
+
+RECEIVER_LATENCY_MS adds an artificial delay per request and
+RECEIVER_FAILURE_RATE makes that fraction of requests answer 503.
+"""
+import asyncio
+import os
+import random
+import time
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse
+
+app = FastAPI(title="Honeypot Callback Receiver")
+LATENCY_MS = float(os.getenv("RECEIVER_LATENCY_MS", "0"))
+FAILURE_RATE = float(os.getenv("RECEIVER_FAILURE_RATE", "0"))
+
+stats = {"requests": 0, "sessions": 0, "failures": 0, "first_at": None, "last_at": None}
+sessions: dict = {}
+
+
+async def _accept(results: list):
+    if LATENCY_MS:
+        await asyncio.sleep(LATENCY_MS / 1000)
+    stats["requests"] += 1
+    if FAILURE_RATE and random.random() < FAILURE_RATE:
+        stats["failures"] += 1
+        return JSONResponse(status_code=503, content={"status": "error"})
+    now = time.time()
+    stats["first_at"] = stats["first_at"] or now
+    stats["last_at"] = now
+    for result in results:
+        stats["sessions"] += 1
+        sessions[result.get("sessionId")] = result
+    return {"status": "ok", "accepted": len(results)}
+
+
+@app.post("/api/updateHoneyPotFinalResult")
+async def receive_one(request: Request):
+    return await _accept([await request.json()])
+
+
+@app.post("/api/updateHoneyPotFinalResults")
+async def receive_bulk(request: Request):
+    body = await request.json()
+    return await _accept(body.get("results") or [])
+
+
+@app.get("/stats")
+def get_stats():
+    return {**stats, "unique_sessions": len(sessions)}
+
+
+@app.post("/reset")
+def reset():
+    stats.update(requests=0, sessions=0, failures=0, first_at=None, last_at=None)
+    sessions.clear()
+    return {"status": "ok"}
@@ -16,3 +16,138 @@ if not GROQ_API_KEY:
 
 MAX_HISTORY = int(os.getenv("MAX_HISTORY", "50"))
 MAX_CONTEXT_CHARS = int(os.getenv("MAX_CONTEXT_CHARS", "8000"))
+
+# Prompt context: recent turns are kept verbatim up to CONTEXT_TOKEN_BUDGET
+# (estimated) tokens; older turns are folded into a per-session summary that
+# keeps at most SUMMARY_MAX_CLAIMS scammer claims. MAX_CONTEXT_CHARS remains a
+# hard cap on the verbatim part.
+CONTEXT_TOKEN_BUDGET = int(os.getenv("CONTEXT_TOKEN_BUDGET", "600"))
+SUMMARY_MAX_CLAIMS = int(os.getenv("SUMMARY_MAX_CLAIMS", "6"))
+
+# Typing delay window (ms) measured from the start of the turn; time spent in
+# the LLM call counts toward it. Set both to 0 to disable.
+TYPING_DELAY_MIN_MS = int(os.getenv("TYPING_DELAY_MIN_MS", "400"))
+TYPING_DELAY_MAX_MS = int(os.getenv("TYPING_DELAY_MAX_MS", "1200"))
+TYPING_DELAY_JITTER = float(os.getenv("TYPING_DELAY_JITTER", "0.15"))
+
+# Stored message encoding: "json" (compact arrays) or "msgpack" (smaller and
+# faster; needs the msgpack package). Either format, and the older JSON
+# objects, can be read. JSON stays the default so workers without msgpack
+# can still read lists written during a rolling upgrade; switch once every
+# worker has it installed.
+HISTORY_CODEC = os.getenv("HISTORY_CODEC", "json").lower()
+
+# Redis session retention. History lists are trimmed to MAX_HISTORY and every
+# session key slides to this TTL on each turn (0 disables expiry).
+HISTORY_TTL_SECONDS = int(os.getenv("HISTORY_TTL_SECONDS", "86400"))
+# Optional JSONL archive for sessions that go idle past HISTORY_TTL_SECONDS.
+SESSION_ARCHIVE_PATH = os.getenv("SESSION_ARCHIVE_PATH", "")
+ARCHIVE_SWEEP_SECONDS = int(os.getenv("ARCHIVE_SWEEP_SECONDS", "60"))
+ARCHIVE_GRACE_SECONDS = int(os.getenv("ARCHIVE_GRACE_SECONDS", "600"))
+
+# In-memory fallback (used while Redis is down): at most MEMORY_MAX_SESSIONS
+# sessions and about MEMORY_MAX_BYTES of state, least recently used evicted
+# first; sessions idle for MEMORY_IDLE_TTL_SECONDS are dropped (0 disables
+# any of the three bounds).
+MEMORY_MAX_SESSIONS = int(os.getenv("MEMORY_MAX_SESSIONS", "10000"))
+MEMORY_MAX_BYTES = int(os.getenv("MEMORY_MAX_BYTES", str(64 * 1024 * 1024)))
+MEMORY_IDLE_TTL_SECONDS = float(os.getenv("MEMORY_IDLE_TTL_SECONDS", "3600"))
+# Callbacks queued in memory while Redis is down; beyond MEMORY_OUTBOX_MAX the
+# oldest are dropped (and logged).
+MEMORY_OUTBOX_MAX = int(os.getenv("MEMORY_OUTBOX_MAX", "10000"))
+
+# Redis circuit breaker: after REDIS_FAILURE_THRESHOLD consecutive failures,
+# skip Redis for REDIS_RESET_TIMEOUT_SECONDS before probing it again.
+REDIS_SOCKET_TIMEOUT = float(os.getenv("REDIS_SOCKET_TIMEOUT", "0.5"))
+REDIS_FAILURE_THRESHOLD = int(os.getenv("REDIS_FAILURE_THRESHOLD", "3"))
+REDIS_RESET_TIMEOUT_SECONDS = float(os.getenv("REDIS_RESET_TIMEOUT_SECONDS", "5"))
+
+# Background CSV log writer: rows are flushed every LOG_BATCH_SIZE rows or
+# LOG_FLUSH_INTERVAL_SECONDS, whichever comes first.
+LOG_BATCH_SIZE = int(os.getenv("LOG_BATCH_SIZE", "100"))
+LOG_FLUSH_INTERVAL_SECONDS = float(os.getenv("LOG_FLUSH_INTERVAL_SECONDS", "1.0"))
+LOG_QUEUE_MAX = int(os.getenv("LOG_QUEUE_MAX", "10000"))
+
+# Log rotation: the hot CSV is moved into LOG_SEGMENT_DIR (default
+# data/log_segments) and compressed once it reaches LOG_ROTATE_BYTES or
+# LOG_ROTATE_SECONDS (0 disables either trigger). LOG_COMPRESSION is gzip,
+# zstd (needs the zstandard package) or none. Only the newest
+# LOG_RETAIN_SEGMENTS segments are kept (0 keeps all).
+LOG_ROTATE_BYTES = int(os.getenv("LOG_ROTATE_BYTES", str(10 * 1024 * 1024)))
+LOG_ROTATE_SECONDS = int(os.getenv("LOG_ROTATE_SECONDS", "86400"))
+LOG_COMPRESSION = os.getenv("LOG_COMPRESSION", "gzip").lower()
+LOG_SEGMENT_DIR = os.getenv("LOG_SEGMENT_DIR", "")
+LOG_RETAIN_SEGMENTS = int(os.getenv("LOG_RETAIN_SEGMENTS", "100"))
+
+# Callback outbox: delivery happens in a background dispatcher with pooled
+# HTTP connections and exponential backoff; entries that still fail after
+# CALLBACK_MAX_ATTEMPTS go to a dead-letter stream.
+CALLBACK_TIMEOUT_SECONDS = float(os.getenv("CALLBACK_TIMEOUT_SECONDS", "10"))
+CALLBACK_MAX_ATTEMPTS = int(os.getenv("CALLBACK_MAX_ATTEMPTS", "6"))
+CALLBACK_BACKOFF_BASE_SECONDS = float(os.getenv("CALLBACK_BACKOFF_BASE_SECONDS", "1"))
+CALLBACK_BACKOFF_MAX_SECONDS = float(os.getenv("CALLBACK_BACKOFF_MAX_SECONDS", "60"))
+CALLBACK_CONCURRENCY = int(os.getenv("CALLBACK_CONCURRENCY", "8"))
+# Pending entries idle this long are reclaimed from crashed workers; keep it
+# above the worst-case retry time so live retries are not delivered twice.
+CALLBACK_CLAIM_IDLE_MS = int(os.getenv("CALLBACK_CLAIM_IDLE_MS", "600000"))
+# Callback target. When CALLBACK_BULK_URL is set, up to CALLBACK_BULK_MAX
+# session summaries are posted together as {"results": [...]} instead of one
+# request per session.
+CALLBACK_URL = os.getenv("CALLBACK_URL", "https://hackathon.guvi.in/api/updateHoneyPotFinalResult")
+CALLBACK_BULK_URL = os.getenv("CALLBACK_BULK_URL", "")
+CALLBACK_BULK_MAX = int(os.getenv("CALLBACK_BULK_MAX", "50"))
+
+# LLM admission control: at most LLM_MAX_CONCURRENCY Groq calls in flight and
+# LLM_MAX_QUEUE waiting. A turn that cannot get a slot and an answer within
+# TURN_DEADLINE_SECONDS of arriving is answered by the local fast path. The
+# same budget bounds the Groq call itself.
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", "8"))
+LLM_MAX_QUEUE = int(os.getenv("LLM_MAX_QUEUE", "32"))
+TURN_DEADLINE_SECONDS = float(os.getenv("TURN_DEADLINE_SECONDS", "8"))
+
+# Hedged LLM calls: with LLM_HEDGE on, a second request is sent when the
+# first has not answered after the LLM_HEDGE_PERCENTILE latency of recent
+# calls (once LLM_HEDGE_MIN_SAMPLES calls are recorded, and never sooner
+# than LLM_HEDGE_MIN_DELAY_MS).
+LLM_HEDGE = os.getenv("LLM_HEDGE", "false").lower() in ("1", "true", "yes")
+LLM_HEDGE_PERCENTILE = float(os.getenv("LLM_HEDGE_PERCENTILE", "95"))
+LLM_HEDGE_MIN_SAMPLES = int(os.getenv("LLM_HEDGE_MIN_SAMPLES", "20"))
+LLM_HEDGE_MIN_DELAY_MS = int(os.getenv("LLM_HEDGE_MIN_DELAY_MS", "250"))
+
+# Pre-LLM fast path: trivial turns (empty, or short with no scam cues in an
+# unflagged session) are answered from templates. Thresholds come from
+# FAST_PATH_CALIBRATION, written by `python fast_path.py --calibrate`.
+FAST_PATH_ENABLED = os.getenv("FAST_PATH_ENABLED", "true").lower() in ("1", "true", "yes")
+FAST_PATH_CALIBRATION = os.getenv("FAST_PATH_CALIBRATION", "data/fast_path.json")
+FAST_PATH_MAX_MISS_RATE = float(os.getenv("FAST_PATH_MAX_MISS_RATE", "0.02"))
+
+# Near-duplicate cache: opening scammer messages of at least
+# SIMILARITY_MIN_WORDS words whose estimated similarity (MinHash over words
+# and word pairs, identifiers masked) to an opening the LLM already
+# classified is at least SIMILARITY_THRESHOLD reuse that classification.
+# Unrelated scam scripts can score around 0.5, so keep the threshold well
+# above that. With
+# SIMILARITY_REUSE_REPLY the cached reply is reused too; otherwise a local
+# template answers.
+SIMILARITY_CACHE_ENABLED = os.getenv("SIMILARITY_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+SIMILARITY_CACHE_SIZE = int(os.getenv("SIMILARITY_CACHE_SIZE", "5000"))
+SIMILARITY_CACHE_TTL_SECONDS = int(os.getenv("SIMILARITY_CACHE_TTL_SECONDS", "3600"))
+SIMILARITY_THRESHOLD = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+SIMILARITY_MIN_WORDS = int(os.getenv("SIMILARITY_MIN_WORDS", "8"))
+SIMILARITY_REUSE_REPLY = os.getenv("SIMILARITY_REUSE_REPLY", "false").lower() in ("1", "true", "yes")
+
+# Exact-prompt cache: identical prompts (same model and temperature) reuse the
+# model's raw answer for PROMPT_CACHE_TTL_SECONDS, and concurrent identical
+# calls share one request. PROMPT_CACHE_REDIS also shares entries through Redis.
+PROMPT_CACHE_ENABLED = os.getenv("PROMPT_CACHE_ENABLED", "true").lower() in ("1", "true", "yes")
+PROMPT_CACHE_SIZE = int(os.getenv("PROMPT_CACHE_SIZE", "1000"))
+PROMPT_CACHE_TTL_SECONDS = int(os.getenv("PROMPT_CACHE_TTL_SECONDS", "300"))
+PROMPT_CACHE_REDIS = os.getenv("PROMPT_CACHE_REDIS", "true").lower() in ("1", "true", "yes")
+
+# Per-session ordering: turns for one sessionId run one at a time in each
+# process and, with SESSION_LEASE_REDIS, across workers through a Redis lease
+# of SESSION_LEASE_MS (keep it above TURN_DEADLINE_SECONDS). A turn that cannot
+# get its session within SESSION_LOCK_TIMEOUT_SECONDS goes ahead unordered.
+SESSION_LOCK_TIMEOUT_SECONDS = float(os.getenv("SESSION_LOCK_TIMEOUT_SECONDS", "10"))
+SESSION_LEASE_REDIS = os.getenv("SESSION_LEASE_REDIS", "false").lower() in ("1", "true", "yes")
+SESSION_LEASE_MS = int(os.getenv("SESSION_LEASE_MS", "15000"))
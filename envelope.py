@@ -0,0 +1,205 @@
+from typing import Any, Dict, List, Tuple
+
+_ESCAPES = {'"': '"', "\\": "\\", "/": "/", "b": "\b", "f": "\f", "n": "\n", "r": "\r", "t": "\t"}
+_LITERALS = {"true": True, "false": False, "null": None, "True": True, "False": False, "None": None}
+_DELIMITERS = set(",:}]") | set(" \t\r\n")
+
+
+def _literal_value(raw: str) -> Any:
+    if raw in _LITERALS:
+        return _LITERALS[raw]
+    try:
+        return int(raw)
+    except ValueError:
+        pass
+    try:
+        return float(raw)
+    except ValueError:
+        return raw
+
+
+class EnvelopeParser:
+    """
+    Incremental, tolerant parser for the model's JSON envelope.
+
+    Feed it text chunks as they arrive. Each feed returns events:
+    ("reply", text) with newly decoded characters of the `stream_key` string,
+    and ("field", key, value) whenever a top-level key's value is complete.
+    Text before the first "{" (prose, ``` fences) and after the object closes
+    is ignored; trailing commas, raw newlines in strings and Python literals
+    are accepted. close() returns the object, completing truncated output.
+    """
+
+    def __init__(self, stream_key: str = "agent_reply"):
+        self.stream_key = stream_key
+        self.fields: Dict[str, Any] = {}
+        self._root: Dict | None = None
+        # Frames are [container, pending_key, key_in_parent]
+        self._stack: List[list] = []
+        self._mode = "seek"
+        self._chars: List[str] = []
+        self._is_key = False
+        self._escape: str | None = None
+        self._high_surrogate: int | None = None
+        self._events: List[Tuple] = []
+
+    @property
+    def done(self) -> bool:
+        return self._mode == "done"
+
+    def _streaming(self) -> bool:
+        return (
+            not self._is_key
+            and len(self._stack) == 1
+            and self._stack[0][1] == self.stream_key
+        )
+
+    def _emit_char(self, ch: str) -> None:
+        self._chars.append(ch)
+        if self._streaming():
+            if self._events and self._events[-1][0] == "reply":
+                self._events[-1] = ("reply", self._events[-1][1] + ch)
+            else:
+                self._events.append(("reply", ch))
+
+    def _assign(self, value: Any, complete: bool = True) -> None:
+        frame = self._stack[-1]
+        container, key = frame[0], frame[1]
+        if isinstance(container, list):
+            container.append(value)
+            return
+        if key is None:
+            # A value without a key: malformed, skip it
+            return
+        container[key] = value
+        frame[1] = None
+        if complete and len(self._stack) == 1:
+            self.fields[key] = value
+            self._events.append(("field", key, value))
+
+    def _open(self, container: Any) -> None:
+        if not self._stack:
+            self._root = container
+            self._stack.append([container, None, None])
+            return
+        parent = self._stack[-1]
+        key_in_parent = parent[1] if isinstance(parent[0], dict) else None
+        self._assign(container, complete=False)
+        self._stack.append([container, None, key_in_parent])
+
+    def _close(self) -> None:
+        container, _, key_in_parent = self._stack.pop()
+        if not self._stack:
+            self._mode = "done"
+        elif len(self._stack) == 1 and key_in_parent is not None:
+            self.fields[key_in_parent] = container
+            self._events.append(("field", key_in_parent, container))
+
+    def _finish_string(self) -> None:
+        text = "".join(self._chars)
+        self._chars = []
+        self._mode = "structure"
+        if self._is_key:
+            if isinstance(self._stack[-1][0], dict):
+                self._stack[-1][1] = text
+        else:
+            self._assign(text)
+
+    def _finish_literal(self) -> None:
+        raw = "".join(self._chars)
+        self._chars = []
+        self._mode = "structure"
+        self._assign(_literal_value(raw))
+
+    def _string_char(self, ch: str) -> None:
+        if self._escape is not None:
+            if self._escape == "":
+                if ch == "u":
+                    self._escape = "u"
+                    return
+                self._escape = None
+                self._emit_char(_ESCAPES.get(ch, ch))
+                return
+            self._escape += ch
+            if len(self._escape) < 5:
+                return
+            hex_digits, self._escape = self._escape[1:], None
+            try:
+                code = int(hex_digits, 16)
+            except ValueError:
+                return
+            if 0xD800 <= code < 0xDC00:
+                self._high_surrogate = code
+                return
+            if 0xDC00 <= code < 0xE000 and self._high_surrogate is not None:
+                code = 0x10000 + ((self._high_surrogate - 0xD800) << 10) + (code - 0xDC00)
+            self._high_surrogate = None
+            self._emit_char(chr(code))
+            return
+        if ch == "\\":
+            self._escape = ""
+        elif ch == '"':
+            self._finish_string()
+        else:
+            self._emit_char(ch)
+
+    def feed(self, chunk: str) -> List[Tuple]:
+        for ch in chunk:
+            mode = self._mode
+            if mode == "string":
+                self._string_char(ch)
+                continue
+            if mode == "literal":
+                if ch not in _DELIMITERS:
+                    self._chars.append(ch)
+                    continue
+                self._finish_literal()
+            elif mode == "seek":
+                if ch == "{":
+                    self._mode = "structure"
+                    self._open({})
+                continue
+            elif mode == "done":
+                break
+
+            if ch in " \t\r\n,:":
+                continue
+            if ch == '"':
+                top = self._stack[-1]
+                self._is_key = isinstance(top[0], dict) and top[1] is None
+                self._mode = "string"
+            elif ch == "{":
+                self._open({})
+            elif ch == "[":
+                self._open([])
+            elif ch in "}]":
+                self._close()
+            elif ch.isalnum() or ch in "-+.":
+                self._mode = "literal"
+                self._chars.append(ch)
+
+        events, self._events = self._events, []
+        return events
+
+    def close(self) -> Dict | None:
+        """
+        Ends the input and returns the parsed object, or None if no object started.
+        """
+        if self._mode == "string":
+            # Keep the truncated value (a cut-off reply is still usable), drop a cut-off key
+            if not self._is_key:
+                self._finish_string()
+        elif self._mode == "literal":
+            self._finish_literal()
+        while self._stack and self._mode != "done":
+            self._close()
+        return self._root
+
+
+def parse_envelope(text: str) -> Dict | None:
+    """
+    One-shot form of EnvelopeParser for a complete (or truncated) model reply.
+    """
+    parser = EnvelopeParser()
+    parser.feed(text)
+    return parser.close()
@@ -2,6 +2,7 @@ import re
 
 _NON_DIGIT = re.compile(r"\D+")
 _NON_ALNUM = re.compile(r"[^A-Z0-9]+")
+_IFSC = re.compile(r"[A-Z]{4}0[A-Z0-9]{6}")
 
 def _normalize_bank_account(raw: str) -> str | None:
     digits = _NON_DIGIT.sub("", raw)
@@ -16,7 +17,7 @@ def _normalize_ifsc(raw: str) -> str | None:
     # IFSC format: 4 letters + 0 + 6 alnum, allow 'O' in place of zero
     if cleaned[4] == "O":
         cleaned = cleaned[:4] + "0" + cleaned[5:]
-    if re.fullmatch(r"[A-Z]{4}0[A-Z0-9]{6}", cleaned):
+    if _IFSC.fullmatch(cleaned):
         return cleaned
     return None
 
@@ -34,42 +35,115 @@ def _normalize_phone(raw: str) -> str | None:
     return None
 
 
-def extract_intel(text: str):
-    upi_pattern = r"\b[\w.-]+@[\w.-]+\b"
-    bank_pattern = r"\b(?:\d[ -]?){9,20}\b"
-    ifsc_pattern = r"\b[A-Z0-9][A-Z0-9\s-]{8,20}[A-Z0-9]\b"
-    url_pattern = r"https?://[^\s]+"
-    phone_pattern = r"\b(?:\+?91[-\s]?)?[6-9]\d{9}\b"
+# One compiled scanner for every identifier type. Matches can only start at a
+# word boundary, so positions inside words are rejected by a single
+# look-behind. Alternatives are tried in order, so URLs win over the
+# UPI-looking parts inside them and UPI handles win over their numeric local
+# part (which is still classified as a number below).
+_SCANNER = re.compile(
+    r"""
+    (?<!\w)
+    (?:
+        (?P<url>https?://[^\s]+)
+      | (?P<upi>[\w.-]+@[\w.-]+\b)
+      | (?P<ifsc>[A-Za-z]{4}(?:[\s-]?0|[Oo])[A-Za-z0-9]{6}\b)
+      | (?P<num>\d(?:[ -]?\d){8,19}\b)
+    )
+    """,
+    re.VERBOSE,
+)
+_HAS_DIGIT = re.compile(r"\d")
 
-    upis_raw = [u for u in re.findall(upi_pattern, text) if "http" not in u.lower()]
-    upis = {_normalize_upi(u) for u in upis_raw}
 
-    bank_candidates = re.findall(bank_pattern, text)
-    bank_accounts = set()
-    for candidate in bank_candidates:
-        normalized = _normalize_bank_account(candidate)
-        if normalized:
-            bank_accounts.add(normalized)
+def _classify_number(raw: str, bank_accounts: set, phone_numbers: set) -> None:
+    # A digit run can be both a bank account and a phone number
+    normalized = _normalize_bank_account(raw)
+    if normalized:
+        bank_accounts.add(normalized)
+    digits = _NON_DIGIT.sub("", raw)
+    if (len(digits) == 10 and digits[0] in "6789") or (
+        len(digits) == 12 and digits.startswith("91") and digits[2] in "6789"
+    ):
+        phone = _normalize_phone(digits)
+        if phone:
+            phone_numbers.add(phone)
 
-    ifsc_candidates = re.findall(ifsc_pattern, text.upper())
-    ifsc_codes = set()
-    for candidate in ifsc_candidates:
-        normalized = _normalize_ifsc(candidate)
-        if normalized:
-            ifsc_codes.add(normalized)
 
-    phones_raw = re.findall(phone_pattern, text)
+def extract_intel(text: str):
+    upis = set()
+    bank_accounts = set()
+    ifsc_codes = set()
+    urls = set()
     phone_numbers = set()
-    for raw in phones_raw:
-        normalized = _normalize_phone(raw)
-        if normalized:
-            phone_numbers.add(normalized)
+
+    for match in _SCANNER.finditer(text):
+        kind = match.lastgroup
+        value = match.group(kind)
+        if kind == "url":
+            urls.add(value)
+        elif kind == "upi":
+            if "http" in value.lower():
+                continue
+            upis.add(_normalize_upi(value))
+            local = value.split("@", 1)[0]
+            if local.isdigit():
+                _classify_number(local, bank_accounts, phone_numbers)
+        elif kind == "ifsc":
+            # "O" for zero is only trusted when the branch part has digits,
+            # otherwise ordinary words ("your order12") would qualify
+            if value[4] in "Oo" and not _HAS_DIGIT.search(value[5:]):
+                continue
+            normalized = _normalize_ifsc(value)
+            if normalized:
+                ifsc_codes.add(normalized)
+        else:
+            _classify_number(value, bank_accounts, phone_numbers)
 
     return {
         "upi_ids": sorted(upis),
         "bank_accounts": sorted(bank_accounts),
         "ifsc_codes": sorted(ifsc_codes),
-        "phishing_urls": sorted(set(re.findall(url_pattern, text))),
+        "phishing_urls": sorted(urls),
         "phone_numbers": sorted(phone_numbers),
         "wallet_addresses": []
     }
+
+def merge_intel(base: dict | None, new: dict | None) -> dict:
+    """
+    Union of two extract_intel results, keeping every key sorted and deduped.
+    """
+    base = base or {}
+    new = new or {}
+    merged = {}
+    for key in ("upi_ids", "bank_accounts", "ifsc_codes", "phishing_urls", "phone_numbers", "wallet_addresses"):
+        merged[key] = sorted(set(base.get(key) or []) | set(new.get(key) or []))
+    return merged
+
+# The honeypot's own self-references, kept consistent across turns
+MAX_PERSONA_FACTS = 6
+_PERSONA_PATTERNS = [
+    re.compile(pattern, re.IGNORECASE)
+    for pattern in (
+        r"\bmy (brother|sister|father|mother|husband|wife|son|daughter)\b",
+        r"\bi am (\d{2})\b",
+        r"\bi'm (\d{2})\b",
+        r"\bmy age is (\d{2})\b",
+        r"\bmy name is ([A-Z][a-z]+)\b",
+        r"\bi live in ([A-Z][a-zA-Z ]+)\b",
+        r"\bmy job is ([a-zA-Z ]+)\b",
+    )
+]
+
+def extract_persona_facts(text: str) -> list:
+    """
+    Persona facts stated in `text`, in pattern order, deduped case-insensitively.
+    """
+    facts = []
+    seen = set()
+    for pattern in _PERSONA_PATTERNS:
+        for match in pattern.findall(text or ""):
+            value = str(match).strip()
+            if value and value.lower() not in seen:
+                seen.add(value.lower())
+                facts.append(value)
+    return facts[:MAX_PERSONA_FACTS]
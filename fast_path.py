@@ -0,0 +1,176 @@
+"""
+Pre-LLM fast path: decides whether a turn is trivial enough to answer from
+templates instead of calling Groq.
+
+Tiers, cheapest first:
+- "empty": no words at all (blank, punctuation, emoji)
+- "trivial": short, no scam or claim keywords, no identifiers, and the
+  session has not been flagged as a scam yet
+- "llm": everything else
+
+The "trivial" thresholds are calibrated against logged LLM outcomes:
+
+    python fast_path.py --calibrate [--start 2026-01-01] [--max-miss-rate 0.02]
+"""
+import argparse
+import json
+import logging
+import os
+import re
+from collections import defaultdict
+from datetime import datetime
+from typing import Dict, Iterable
+
+from config import FAST_PATH_ENABLED, FAST_PATH_CALIBRATION, FAST_PATH_MAX_MISS_RATE
+from agent import count_tokens, detect_scam
+from extract_intel import extract_intel
+from keywords import scan as scan_keywords
+
+logger = logging.getLogger(__name__)
+
+_WORD = re.compile(r"\w")
+_INTEL_KEYS = ("upi_ids", "bank_accounts", "ifsc_codes", "phishing_urls", "phone_numbers")
+# Grid searched by calibrate(); detect_scam only produces multiples of 0.1
+_TOKEN_STEPS = (3, 4, 6, 8, 12, 16, 24)
+_CONFIDENCE_STEPS = (0.0, 0.2, 0.3)
+_MIN_CALIBRATION_SKIPS = 20
+
+
+class FastPathClassifier:
+    def __init__(self, max_tokens: int = 4, max_confidence: float = 0.0, enabled: bool = True):
+        self.max_tokens = max_tokens
+        self.max_confidence = max_confidence
+        self.enabled = enabled
+        self.counts: Dict[str, int] = defaultdict(int)
+
+    @classmethod
+    def load(cls, path: str, enabled: bool = True) -> "FastPathClassifier":
+        try:
+            with open(path, encoding="utf-8") as f:
+                calibration = json.load(f)
+            return cls(
+                max_tokens=int(calibration["max_tokens"]),
+                max_confidence=float(calibration["max_confidence"]),
+                enabled=enabled,
+            )
+        except FileNotFoundError:
+            return cls(enabled=enabled)
+        except (ValueError, KeyError, TypeError):
+            logger.warning("Ignoring unreadable fast-path calibration at %s", path)
+            return cls(enabled=enabled)
+
+    def tier(self, text: str, flagged: bool = False) -> str:
+        text = text or ""
+        if not _WORD.search(text):
+            return "empty"
+        if flagged or count_tokens(text) > self.max_tokens:
+            return "llm"
+        if detect_scam(text) > self.max_confidence or scan_keywords(text).has("claim_cue"):
+            return "llm"
+        intel = extract_intel(text)
+        if any(intel.get(key) for key in _INTEL_KEYS):
+            return "llm"
+        return "trivial"
+
+    def classify(self, text: str, state: Dict | None = None) -> str:
+        """
+        Tier for the inbound message of a live turn; counted for metrics.
+        """
+        if not self.enabled:
+            return "llm"
+        state = state or {}
+        intel = state.get("intel") or {}
+        flagged = bool(state.get("scam_detected")) or any(intel.get(key) for key in _INTEL_KEYS)
+        result = self.tier(text, flagged)
+        self.counts[result] += 1
+        return result
+
+    def metrics(self) -> Dict:
+        total = sum(self.counts.values())
+        skipped = total - self.counts["llm"]
+        return {
+            "enabled": self.enabled,
+            "max_tokens": self.max_tokens,
+            "max_confidence": self.max_confidence,
+            "turns": total,
+            "skipped": skipped,
+            "skip_rate": round(skipped / total, 4) if total else 0.0,
+            **{f"tier_{name}": count for name, count in sorted(self.counts.items())},
+        }
+
+
+def _labelled_turns(rows: Iterable[dict]):
+    """
+    (text, flagged_before, llm_said_scam) for every inbound message the LLM
+    answered. Fast-path rows are skipped so the fast path never grades itself.
+    """
+    flagged = set()
+    for row in rows:
+        if row.get("event_type") != "message" or row.get("tier") not in (None, "", "llm"):
+            continue
+        if (row.get("sender") or "").lower() == "honeypot":
+            continue
+        session_id = row.get("session_id")
+        scam = (row.get("scam_detected") or "").lower() == "true"
+        yield row.get("message") or "", session_id in flagged, scam
+        if scam:
+            flagged.add(session_id)
+
+
+def calibrate(rows: Iterable[dict], max_miss_rate: float = FAST_PATH_MAX_MISS_RATE) -> Dict:
+    """
+    Picks the (max_tokens, max_confidence) pair that skips the most logged
+    turns while keeping the share of skipped turns the LLM called a scam at
+    or below `max_miss_rate`.
+    """
+    turns = list(_labelled_turns(rows))
+    best = {"max_tokens": 4, "max_confidence": 0.0, "skip_rate": 0.0, "miss_rate": 0.0}
+    best_skips = -1
+    for max_tokens in _TOKEN_STEPS:
+        for max_confidence in _CONFIDENCE_STEPS:
+            classifier = FastPathClassifier(max_tokens, max_confidence)
+            skipped = misses = 0
+            for text, flagged, scam in turns:
+                if classifier.tier(text, flagged) != "llm":
+                    skipped += 1
+                    misses += scam
+            miss_rate = misses / skipped if skipped else 0.0
+            if miss_rate <= max_miss_rate and skipped > best_skips:
+                best_skips = skipped
+                best = {
+                    "max_tokens": max_tokens,
+                    "max_confidence": max_confidence,
+                    "skip_rate": round(skipped / len(turns), 4) if turns else 0.0,
+                    "miss_rate": round(miss_rate, 4),
+                }
+    if best_skips < _MIN_CALIBRATION_SKIPS:
+        # Too little evidence to loosen anything; keep the conservative defaults
+        best = {"max_tokens": 4, "max_confidence": 0.0, "skip_rate": best["skip_rate"], "miss_rate": best["miss_rate"]}
+    best.update(samples=len(turns), max_miss_rate=max_miss_rate, calibrated_at=datetime.utcnow().isoformat())
+    return best
+
+
+FAST_PATH = FastPathClassifier.load(FAST_PATH_CALIBRATION, enabled=FAST_PATH_ENABLED)
+
+
+def main_cli():
+    from logger import iter_log_rows
+
+    parser = argparse.ArgumentParser(description="Calibrate the pre-LLM fast path from logged outcomes.")
+    parser.add_argument("--calibrate", action="store_true", help="write the calibration file")
+    parser.add_argument("--start", help="only use rows at or after this ISO timestamp")
+    parser.add_argument("--end", help="only use rows at or before this ISO timestamp")
+    parser.add_argument("--max-miss-rate", type=float, default=FAST_PATH_MAX_MISS_RATE)
+    args = parser.parse_args()
+
+    result = calibrate(iter_log_rows(args.start, args.end), args.max_miss_rate)
+    print(json.dumps(result, indent=2))
+    if args.calibrate:
+        os.makedirs(os.path.dirname(FAST_PATH_CALIBRATION) or ".", exist_ok=True)
+        with open(FAST_PATH_CALIBRATION, "w", encoding="utf-8") as f:
+            json.dump(result, f, indent=2)
+        print(f"Wrote {FAST_PATH_CALIBRATION}")
+
+
+if __name__ == "__main__":
+    main_cli()
@@ -0,0 +1,165 @@
+from collections import deque
+from typing import Dict, Iterable, List, Set
+
+try:
+    # Optional C implementation; the pure-Python automaton below is used otherwise
+    import ahocorasick
+except Exception:
+    ahocorasick = None
+
+# Every keyword list used for scoring, tone detection, history sanitizing and
+# callback notes. All of them are matched case-insensitively as substrings.
+KEYWORD_CATEGORIES: Dict[str, List[str]] = {
+    # agent.detect_scam
+    "scam_signal": [
+        "upi", "account", "bank", "verify", "verification",
+        "refund", "prize", "lottery", "offer", "limited",
+        "click", "link", "payment", "urgent", "kyc",
+    ],
+    "scam_urgency": ["urgent", "now"],
+    "scam_payment": ["bank", "upi"],
+    # agent._scammer_tone
+    "aggressive": [
+        "urgent", "immediately", "now", "blocked", "suspended",
+        "legal action", "police", "fraud", "last chance",
+        "your account will", "final warning",
+    ],
+    # agent._sanitize_history
+    "meta_phrase": [
+        "the user wants",
+        "the instructions",
+        "output only",
+        "we need to output",
+        "the scenario",
+        "pre-configured",
+        "instruction says",
+        "the scammer must",
+        "final output",
+        "success!",
+        "honeypot testing completed",
+    ],
+    "instruction_token": ["must", "should", "instruction", "output", "json", "keys", "format"],
+    # agent.update_context_summary: sentences worth keeping as scammer claims
+    "claim_cue": [
+        "i am", "i'm", "calling from", "this is", "officer", "department",
+        "head office", "manager", "executive", "rbi", "police", "customs",
+        "your account", "will be blocked", "has been", "refund", "prize",
+    ],
+    # callback notes
+    "suspicious": [
+        "urgent",
+        "verify",
+        "verification",
+        "account blocked",
+        "account suspended",
+        "kyc",
+        "click",
+        "link",
+        "payment",
+        "upi",
+        "bank",
+        "refund",
+    ],
+    "banking_term": ["kyc", "ifsc", "otp", "account", "bank", "verification"],
+    "urgency_term": ["urgent", "immediately", "blocked", "suspended", "2 hours", "limited time"],
+}
+
+
+class KeywordHits:
+    """
+    Result of one scan: which keywords of each category occurred in the text.
+    """
+
+    __slots__ = ("_found", "_categories")
+
+    def __init__(self, found: Set[str], categories: Dict[str, List[str]]):
+        self._found = found
+        self._categories = categories
+
+    def has(self, category: str) -> bool:
+        return any(kw in self._found for kw in self._categories.get(category, ()))
+
+    def keywords(self, category: str) -> List[str]:
+        # Category order, not text order, so callers get stable output
+        return [kw for kw in self._categories.get(category, ()) if kw in self._found]
+
+    def __contains__(self, keyword: str) -> bool:
+        return keyword in self._found
+
+
+class KeywordEngine:
+    """
+    Aho-Corasick automaton over every keyword in every category. One pass over
+    the lowercased text reports all (including overlapping) keyword hits.
+    """
+
+    def __init__(self, categories: Dict[str, Iterable[str]]):
+        self.categories = {name: [kw.lower() for kw in kws] for name, kws in categories.items()}
+        keywords = sorted({kw for kws in self.categories.values() for kw in kws if kw})
+        if ahocorasick is not None:
+            self._automaton = ahocorasick.Automaton()
+            for kw in keywords:
+                self._automaton.add_word(kw, kw)
+            self._automaton.make_automaton()
+        else:
+            self._automaton = None
+            self._build(keywords)
+
+    def _build(self, keywords: List[str]) -> None:
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[tuple] = [()]
+        for kw in keywords:
+            state = 0
+            for ch in kw:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append(())
+                    nxt = len(self._goto) - 1
+                    self._goto[state][ch] = nxt
+                state = nxt
+            self._out[state] = (kw,)
+
+        # Breadth-first fail links; outputs inherit those of their fail state
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fallback = self._fail[state]
+                while fallback and ch not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(ch, 0)
+                self._fail[nxt] = target if target != nxt else 0
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def scan(self, text: str) -> KeywordHits:
+        found: Set[str] = set()
+        if not text:
+            return KeywordHits(found, self.categories)
+        lowered = text.lower()
+        if self._automaton is not None:
+            for _, kw in self._automaton.iter(lowered):
+                found.add(kw)
+            return KeywordHits(found, self.categories)
+
+        goto = self._goto
+        fail = self._fail
+        out = self._out
+        state = 0
+        for ch in lowered:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return KeywordHits(found, self.categories)
+
+
+ENGINE = KeywordEngine(KEYWORD_CATEGORIES)
+
+
+def scan(text: str) -> KeywordHits:
+    return ENGINE.scan(text)
@@ -1,9 +1,42 @@
+import atexit
 import csv
+import gzip
+import io
+import json
+import logging
 import os
+import queue
+import shutil
+import threading
+import time
 from datetime import datetime
+from threading import Lock
+
+from config import (
+    LOG_BATCH_SIZE,
+    LOG_FLUSH_INTERVAL_SECONDS,
+    LOG_QUEUE_MAX,
+    LOG_ROTATE_BYTES,
+    LOG_ROTATE_SECONDS,
+    LOG_COMPRESSION,
+    LOG_SEGMENT_DIR,
+    LOG_RETAIN_SEGMENTS,
+)
+
+try:
+    import zstandard
+except Exception:
+    zstandard = None
 
 FILE_PATH = "data/scam_logs.csv"
 
+# Guards the session archive file, which is written from worker threads
+_write_lock = Lock()
+
+# Restart delays after the writer thread fails (doubling up to the maximum)
+_RETRY_BASE_SECONDS = 1.0
+_RETRY_MAX_SECONDS = 60.0
+
 _HEADER = [
     "timestamp",
     "session_id",
@@ -19,6 +52,7 @@ _HEADER = [
     "phone_numbers",
     "suspicious_phrases",
     "sophistication",
+    "tier",
 ]
 
 def _ensure_header_up_to_date():
@@ -38,9 +72,374 @@ def _ensure_header_up_to_date():
         # If header repair fails, leave file as-is to avoid data loss
         pass
 
-def _ensure_writer(writer):
-    if not os.path.isfile(FILE_PATH):
-        writer.writerow(_HEADER)
+class _LogWriter:
+    """
+    Background CSV writer. Rows are queued by the request path and written
+    in batches by one thread that keeps the log file open; the header is
+    checked once when the writer starts instead of on every event. The same
+    thread rotates the file into compressed segments by size or age. If the
+    thread dies (e.g. the file cannot be opened), the error is kept in
+    `error` and restarts back off while rows wait in the queue.
+    """
+
+    def __init__(self):
+        self._queue: queue.Queue = queue.Queue(maxsize=LOG_QUEUE_MAX)
+        self._thread: threading.Thread | None = None
+        self._start_lock = Lock()
+        self._flushed = threading.Condition()
+        self._pending = 0
+        self._running = False
+        self._retry_delay = 0.0
+        self._retry_at = 0.0
+        self.error: BaseException | None = None
+        self.dropped = 0
+
+    def start(self) -> None:
+        with self._start_lock:
+            if self._running:
+                return
+            with self._flushed:
+                self._running = True
+            self._thread = threading.Thread(target=self._run, name="csv-log-writer", daemon=True)
+            self._thread.start()
+
+    def submit(self, row: list) -> None:
+        if not self._running and time.monotonic() >= self._retry_at:
+            self.start()
+        with self._flushed:
+            self._pending += 1
+        try:
+            self._queue.put_nowait(row)
+        except queue.Full:
+            # Never block the event loop on logging
+            with self._flushed:
+                self._pending -= 1
+                self._flushed.notify_all()
+            self.dropped += 1
+            logging.warning("CSV log queue full; dropped row (%d total).", self.dropped)
+
+    def flush(self, timeout: float | None = None) -> bool:
+        """
+        Blocks until every submitted row has been written. Returns False on
+        timeout, or at once if rows are waiting but the writer is not running.
+        """
+        with self._flushed:
+            self._flushed.wait_for(lambda: self._pending == 0 or not self._running, timeout)
+            return self._pending == 0
+
+    def stop(self, timeout: float = 5.0) -> None:
+        thread = self._thread
+        if not thread or not thread.is_alive():
+            return
+        self._queue.put(_STOP)
+        thread.join(timeout)
+
+    def _open(self) -> None:
+        directory = os.path.dirname(FILE_PATH)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        _ensure_header_up_to_date()
+        is_new = not os.path.isfile(FILE_PATH) or os.path.getsize(FILE_PATH) == 0
+        # Rows already in the hot file (from a previous run) belong to this segment
+        self._segment = _Segment() if is_new else _scan_segment(FILE_PATH)
+        self._handle = open(FILE_PATH, "a", newline="", encoding="utf-8")
+        self._csv = csv.writer(self._handle)
+        if is_new:
+            self._csv.writerow(_HEADER)
+            self._handle.flush()
+
+    def _write(self, batch: list) -> None:
+        self._csv.writerows(batch)
+        self._handle.flush()
+        for row in batch:
+            self._segment.add(row[0], row[1])
+
+    def _should_rotate(self) -> bool:
+        if not self._segment.rows:
+            return False
+        if LOG_ROTATE_BYTES and self._handle.tell() >= LOG_ROTATE_BYTES:
+            return True
+        return bool(LOG_ROTATE_SECONDS) and time.time() - self._segment.opened_at >= LOG_ROTATE_SECONDS
+
+    def _rotate(self) -> None:
+        self._handle.close()
+        try:
+            _close_segment(self._segment)
+        except Exception:
+            logging.exception("Log rotation failed; continuing with the current file")
+        self._open()
+
+    def _run(self) -> None:
+        try:
+            self._open()
+        except Exception as exc:
+            logging.exception("Cannot open CSV log %s", FILE_PATH)
+            self._stopped(exc)
+            return
+        self._retry_delay = 0.0
+        self.error = None
+        error = None
+        try:
+            stopping = False
+            while not stopping:
+                batch = []
+                try:
+                    item = self._queue.get(timeout=LOG_FLUSH_INTERVAL_SECONDS)
+                except queue.Empty:
+                    # Idle: time-based rotation still has to happen
+                    if self._should_rotate():
+                        self._rotate()
+                    continue
+                deadline = time.monotonic() + LOG_FLUSH_INTERVAL_SECONDS
+                while True:
+                    if item is _STOP:
+                        stopping = True
+                        break
+                    batch.append(item)
+                    if len(batch) >= LOG_BATCH_SIZE:
+                        break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        break
+                    try:
+                        item = self._queue.get(timeout=remaining)
+                    except queue.Empty:
+                        break
+                if batch:
+                    try:
+                        self._write(batch)
+                    except Exception:
+                        logging.exception("Failed to write %d CSV log rows", len(batch))
+                    with self._flushed:
+                        self._pending -= len(batch)
+                        self._flushed.notify_all()
+                if self._should_rotate():
+                    self._rotate()
+        except Exception as exc:
+            logging.exception("CSV log writer failed")
+            error = exc
+        finally:
+            self._handle.close()
+            self._stopped(error)
+
+    def _stopped(self, error: BaseException | None) -> None:
+        """
+        Marks the thread as gone and wakes flush() waiters. After a failure the
+        next start is delayed, doubling up to _RETRY_MAX_SECONDS.
+        """
+        if error is not None:
+            self.error = error
+            self._retry_delay = min(_RETRY_MAX_SECONDS, self._retry_delay * 2 or _RETRY_BASE_SECONDS)
+            self._retry_at = time.monotonic() + self._retry_delay
+            logging.warning("CSV log writer stopped; retrying in %.0fs.", self._retry_delay)
+        with self._flushed:
+            self._running = False
+            self._flushed.notify_all()
+
+
+class _Segment:
+    """
+    What the manifest needs to know about the hot log file.
+    """
+
+    def __init__(self):
+        self.opened_at = time.time()
+        self.start = ""
+        self.end = ""
+        self.rows = 0
+        self.session_ids: set = set()
+
+    def add(self, timestamp: str, session_id: str) -> None:
+        if timestamp:
+            if not self.start or timestamp < self.start:
+                self.start = timestamp
+            if timestamp > self.end:
+                self.end = timestamp
+        if session_id:
+            self.session_ids.add(session_id)
+        self.rows += 1
+
+
+def _scan_segment(path: str) -> _Segment:
+    segment = _Segment()
+    try:
+        segment.opened_at = os.path.getmtime(path)
+        with open(path, "r", newline="", encoding="utf-8") as f:
+            reader = csv.reader(f)
+            next(reader, None)
+            for row in reader:
+                if len(row) >= 2:
+                    segment.add(row[0], row[1])
+    except Exception:
+        logging.exception("Could not index existing log %s", path)
+    return segment
+
+
+def _segment_dir() -> str:
+    return LOG_SEGMENT_DIR or os.path.join(os.path.dirname(FILE_PATH) or ".", "log_segments")
+
+def _manifest_path() -> str:
+    return os.path.join(_segment_dir(), "manifest.json")
+
+def read_manifest() -> list:
+    try:
+        with open(_manifest_path(), "r", encoding="utf-8") as f:
+            entries = json.load(f)
+        return entries if isinstance(entries, list) else []
+    except FileNotFoundError:
+        return []
+    except Exception:
+        logging.exception("Unreadable log manifest %s", _manifest_path())
+        return []
+
+def _write_manifest(entries: list) -> None:
+    path = _manifest_path()
+    tmp = path + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(entries, f, indent=1)
+    os.replace(tmp, path)
+
+def _compression() -> str:
+    if LOG_COMPRESSION == "zstd" and zstandard is None:
+        logging.warning("zstandard not installed; compressing log segments with gzip.")
+        return "gzip"
+    return LOG_COMPRESSION if LOG_COMPRESSION in ("gzip", "zstd", "none") else "gzip"
+
+def _compress(path: str, method: str) -> str:
+    """
+    Writes a compressed copy of `path` and returns its name. The original is
+    left in place; a partial copy is removed on failure.
+    """
+    target = path + (".zst" if method == "zstd" else ".gz")
+    try:
+        if method == "zstd":
+            with open(path, "rb") as src, open(target, "wb") as dst:
+                zstandard.ZstdCompressor().copy_stream(src, dst)
+        else:
+            with open(path, "rb") as src, gzip.open(target, "wb") as dst:
+                shutil.copyfileobj(src, dst)
+    except BaseException:
+        _remove_quietly(target)
+        raise
+    return target
+
+def _remove_quietly(path: str) -> None:
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _close_segment(segment: _Segment) -> None:
+    """
+    Moves the hot file into the segment directory, records its time range
+    and session IDs in the manifest and then compresses it. The manifest
+    entry is written before compressing and only switched to the compressed
+    file once that succeeds, so a failure never leaves a segment unlisted.
+    """
+    directory = _segment_dir()
+    os.makedirs(directory, exist_ok=True)
+    stamp = (segment.start or datetime.utcnow().isoformat()).replace(":", "").replace("-", "").split(".")[0]
+    base = os.path.join(directory, f"scam_logs-{stamp}")
+    name = base + ".csv"
+    suffix = 1
+    while any(os.path.exists(name + ext) for ext in ("", ".gz", ".zst")):
+        name = f"{base}-{suffix}.csv"
+        suffix += 1
+    os.replace(FILE_PATH, name)
+
+    entries = read_manifest()
+    entry = {
+        "file": os.path.basename(name),
+        "compression": "none",
+        "start": segment.start,
+        "end": segment.end,
+        "rows": segment.rows,
+        "bytes": os.path.getsize(name),
+        "session_ids": sorted(segment.session_ids),
+    }
+    entries.append(entry)
+
+    # Retention keeps disk use bounded: drop the oldest segments
+    if LOG_RETAIN_SEGMENTS and len(entries) > LOG_RETAIN_SEGMENTS:
+        expired, entries = entries[:-LOG_RETAIN_SEGMENTS], entries[-LOG_RETAIN_SEGMENTS:]
+        for old in expired:
+            _remove_quietly(os.path.join(directory, old["file"]))
+    _write_manifest(entries)
+
+    method = _compression()
+    if method == "none":
+        return
+    final = _compress(name, method)
+    entry.update(file=os.path.basename(final), compression=method, bytes=os.path.getsize(final))
+    try:
+        _write_manifest(entries)
+    except BaseException:
+        # The manifest still lists the uncompressed file; keep that one
+        _remove_quietly(final)
+        raise
+    os.remove(name)
+
+
+def _open_segment(path: str, compression: str):
+    if compression == "gzip":
+        return gzip.open(path, "rt", newline="", encoding="utf-8")
+    if compression == "zstd":
+        if zstandard is None:
+            raise RuntimeError("zstandard is required to read .zst log segments")
+        raw = open(path, "rb")
+        return io.TextIOWrapper(zstandard.ZstdDecompressor().stream_reader(raw), encoding="utf-8", newline="")
+    return open(path, "r", newline="", encoding="utf-8")
+
+def iter_log_rows(start: str | None = None, end: str | None = None, session_id: str | None = None):
+    """
+    Yields log rows (as dicts) from rotated segments and the hot file. The
+    manifest lets segments outside [start, end] or without `session_id` be
+    skipped without opening them. Timestamps are ISO strings.
+    """
+    sources = []
+    for entry in read_manifest():
+        if start and entry.get("end") and entry["end"] < start:
+            continue
+        if end and entry.get("start") and entry["start"] > end:
+            continue
+        if session_id and session_id not in entry.get("session_ids", []):
+            continue
+        sources.append((os.path.join(_segment_dir(), entry["file"]), entry.get("compression", "none")))
+    if os.path.isfile(FILE_PATH):
+        sources.append((FILE_PATH, "none"))
+
+    for path, compression in sources:
+        try:
+            f = _open_segment(path, compression)
+        except FileNotFoundError:
+            continue
+        with f:
+            for row in csv.DictReader(f):
+                timestamp = row.get("timestamp") or ""
+                if start and timestamp < start:
+                    continue
+                if end and timestamp > end:
+                    continue
+                if session_id and row.get("session_id") != session_id:
+                    continue
+                yield row
+
+
+_STOP = object()
+_writer = _LogWriter()
+atexit.register(_writer.stop)
+
+def start_writer() -> None:
+    _writer.start()
+
+def flush_writer(timeout: float | None = None) -> bool:
+    return _writer.flush(timeout)
+
+def stop_writer() -> None:
+    _writer.stop()
+
+def _append_row(row):
+    _writer.submit(row)
 
 def _join_list(values):
     return ",".join([str(v) for v in values if v])
@@ -53,28 +452,27 @@ def log_message_event(
     confidence: float | None = None,
     scam_detected: bool | None = None,
     suspicious_phrases: list | None = None,
+    event_type: str = "message",
+    tier: str = "",
 ):
     intel = intel or {}
-    _ensure_header_up_to_date()
-    with open(FILE_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        _ensure_writer(writer)
-        writer.writerow([
-            datetime.utcnow().isoformat(),
-            session_id,
-            "message",
-            sender,
-            message,
-            bool(scam_detected) if scam_detected is not None else "",
-            float(confidence) if confidence is not None else "",
-            _join_list(intel.get("upi_ids", [])),
-            _join_list(intel.get("bank_accounts", [])),
-            _join_list(intel.get("ifsc_codes", [])),
-            _join_list(intel.get("phishing_urls", [])),
-            _join_list(intel.get("phone_numbers", [])),
-            _join_list(suspicious_phrases or []),
-            "",
-        ])
+    _append_row([
+        datetime.utcnow().isoformat(),
+        session_id,
+        event_type,
+        sender,
+        message,
+        bool(scam_detected) if scam_detected is not None else "",
+        float(confidence) if confidence is not None else "",
+        _join_list(intel.get("upi_ids", [])),
+        _join_list(intel.get("bank_accounts", [])),
+        _join_list(intel.get("ifsc_codes", [])),
+        _join_list(intel.get("phishing_urls", [])),
+        _join_list(intel.get("phone_numbers", [])),
+        _join_list(suspicious_phrases or []),
+        "",
+        tier,
+    ])
 
 def log_summary_event(
     session_id: str,
@@ -82,26 +480,23 @@ def log_summary_event(
     suspicious_phrases: list | None = None,
     sophistication: str | None = None,
 ):
-    _ensure_header_up_to_date()
-    with open(FILE_PATH, "a", newline="", encoding="utf-8") as f:
-        writer = csv.writer(f)
-        _ensure_writer(writer)
-        writer.writerow([
-            datetime.utcnow().isoformat(),
-            session_id,
-            "summary",
-            "",
-            "",
-            True,
-            "",
-            _join_list(intel.get("upi_ids", [])),
-            _join_list(intel.get("bank_accounts", [])),
-            _join_list(intel.get("ifsc_codes", [])),
-            _join_list(intel.get("phishing_urls", [])),
-            _join_list(intel.get("phone_numbers", [])),
-            _join_list(suspicious_phrases or []),
-            sophistication or "",
-        ])
+    _append_row([
+        datetime.utcnow().isoformat(),
+        session_id,
+        "summary",
+        "",
+        "",
+        True,
+        "",
+        _join_list(intel.get("upi_ids", [])),
+        _join_list(intel.get("bank_accounts", [])),
+        _join_list(intel.get("ifsc_codes", [])),
+        _join_list(intel.get("phishing_urls", [])),
+        _join_list(intel.get("phone_numbers", [])),
+        _join_list(suspicious_phrases or []),
+        sophistication or "",
+        "",
+    ])
 
 # Backwards-compatible wrapper
 def log_scam(session_id, intel, confidence):
@@ -113,3 +508,19 @@ def log_scam(session_id, intel, confidence):
         confidence=confidence,
         scam_detected=True,
     )
+
+def archive_session(path: str, session_id: str, messages: list):
+    """
+    Appends one expired session (as a JSON line) to the archive file.
+    """
+    record = {
+        "archived_at": datetime.utcnow().isoformat(),
+        "session_id": session_id,
+        "messages": [m._asdict() if hasattr(m, "_asdict") else m for m in messages],
+    }
+    directory = os.path.dirname(path)
+    with _write_lock:
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(record) + "\n")
@@ -1,17 +1,34 @@
 from fastapi import FastAPI, Header, HTTPException, Request
 from fastapi.exceptions import RequestValidationError
-from fastapi.responses import JSONResponse
+from fastapi.responses import JSONResponse, StreamingResponse
+import asyncio
+import hashlib
+import json
 import logging
 import time
-from typing import Any
+from dataclasses import dataclass
+from typing import Any, AsyncIterator, Dict, List
 
-from schemas import MessageContent, HoneypotResponse
-from config import API_KEY
-from redis_store import append_message, get_history, set_history, mark_callback_sent, redis_available
-from agent import generate_agent_response, extract_intelligence_from_history, extract_persona_facts_from_history
-from memory import update_persona_facts, get_persona_facts
-from callback import send_final_callback
-from logger import log_message_event
+from schemas import HistoryMessage, HoneypotResponse
+from config import API_KEY, SESSION_ARCHIVE_PATH, TURN_DEADLINE_SECONDS
+from redis_store import load_and_append, commit_turn, redis_available, set_archive_hook, run_archive_sweeper
+from admission import LLM_LIMITER, Deadline
+from fast_path import FAST_PATH
+from similarity_cache import SIMILARITY_CACHE
+from prompt_cache import PROMPT_CACHE
+from session_lock import SESSION_LOCKS, SessionLease, SingleFlight
+from agent import (
+    generate_agent_response,
+    local_agent_response,
+    stream_agent_response,
+    update_intel_state,
+    update_context_summary,
+    build_context,
+)
+from memory import metrics as memory_metrics
+from callback import enqueue_final_callback, run_callback_dispatcher
+from logger import log_message_event, archive_session, start_writer, stop_writer
+from typing_delay import wait_for_typing_window
 
 logging.basicConfig(
     level=logging.INFO,
@@ -20,17 +37,59 @@ logging.basicConfig(
 
 app = FastAPI(title="Agentic Honeypot API")
 SAFE_FALLBACK_REPLY = "I'm not sure about this. Could you please share the official helpline or website so I can verify?"
+_background_tasks: set[asyncio.Task] = set()
+# Post-stream persistence of /honeypot/message/stream turns
+_turn_tasks: set[asyncio.Task] = set()
+# Duplicate requests (retries) arriving while the original is running share its result
+_turns_in_flight = SingleFlight()
 
 @app.on_event("startup")
-def warn_if_redis_unavailable():
-    if not redis_available():
+async def warn_if_redis_unavailable():
+    if not await redis_available():
         logging.warning("Redis unavailable at startup; falling back to in-memory store.")
 
+@app.on_event("startup")
+def start_log_writer():
+    start_writer()
+
+@app.on_event("startup")
+async def start_session_archiver():
+    if not SESSION_ARCHIVE_PATH:
+        return
+    set_archive_hook(lambda sid, messages: asyncio.to_thread(archive_session, SESSION_ARCHIVE_PATH, sid, messages))
+    _background_tasks.add(asyncio.create_task(run_archive_sweeper()))
+
+@app.on_event("startup")
+async def start_callback_dispatcher():
+    _background_tasks.add(asyncio.create_task(run_callback_dispatcher()))
+
+@app.on_event("shutdown")
+async def stop_background_tasks():
+    # Let streamed turns finish persisting before anything else stops
+    await asyncio.gather(*_turn_tasks, return_exceptions=True)
+    for task in _background_tasks:
+        task.cancel()
+    await asyncio.gather(*_background_tasks, return_exceptions=True)
+    _background_tasks.clear()
+    # Drain queued CSV rows before the process exits
+    await asyncio.to_thread(stop_writer)
+
 @app.get("/")
 @app.head("/")
 def health_check():
     return {"status": "Agent is awake!", "endpoint": "/honeypot/message"}
 
+@app.get("/metrics")
+def metrics():
+    return {
+        "llm": LLM_LIMITER.metrics(),
+        "fast_path": FAST_PATH.metrics(),
+        "similarity_cache": SIMILARITY_CACHE.metrics(),
+        "prompt_cache": PROMPT_CACHE.metrics(),
+        "sessions": {**SESSION_LOCKS.metrics(), "in_flight": len(_turns_in_flight), "coalesced": _turns_in_flight.coalesced},
+        "memory": memory_metrics(),
+    }
+
 @app.exception_handler(RequestValidationError)
 async def validation_exception_handler(request: Request, exc: RequestValidationError):
     logging.error("VAL_ERROR: %s", exc.errors())
@@ -45,13 +104,18 @@ async def validation_exception_handler(request: Request, exc: RequestValidationE
         },
     )
 
-def _safe_int(value: Any, default: int) -> int:
+def _safe_int(value: Any, default: int | None) -> int | None:
     try:
         return int(value)
     except Exception:
         return default
 
-def _coerce_message(raw: Any, fallback_text: str) -> MessageContent:
+def _client_timestamp(raw: Any) -> int | None:
+    if isinstance(raw, dict) and raw.get("timestamp") is not None:
+        return _safe_int(raw.get("timestamp"), None)
+    return None
+
+def _coerce_message(raw: Any, fallback_text: str) -> HistoryMessage:
     now_ms = int(time.time() * 1000)
     if isinstance(raw, dict):
         sender = raw.get("sender") or "user"
@@ -66,7 +130,7 @@ def _coerce_message(raw: Any, fallback_text: str) -> MessageContent:
         text = fallback_text or ""
         timestamp = now_ms
 
-    return MessageContent(sender=sender, text=text, timestamp=timestamp)
+    return HistoryMessage(str(sender), str(text), timestamp)
 
 async def _read_json_or_empty(request: Request) -> dict:
     try:
@@ -77,14 +141,77 @@ async def _read_json_or_empty(request: Request) -> dict:
     except Exception:
         return {}
 
-async def _handle_message_universal(
-    request: Request,
-    x_api_key: str | None,
-):
+def _log_turn(session_id: str, inbound: HistoryMessage, reply_text: str, agent_data: dict, suspicious_phrases: list) -> None:
+    extracted = agent_data.get("extracted_intelligence", {})
+    # The answering tier is logged so fast-path calibration only learns from LLM outcomes
+    tier = agent_data.get("fast_path") or "llm"
+    log_message_event(
+        session_id=session_id,
+        sender=inbound.sender,
+        message=inbound.text,
+        intel=extracted,
+        confidence=agent_data.get("confidence_score"),
+        scam_detected=agent_data.get("scam_detected"),
+        suspicious_phrases=suspicious_phrases,
+        tier=tier,
+    )
+    log_message_event(
+        session_id=session_id,
+        sender="honeypot",
+        message=reply_text,
+        intel=extracted,
+        confidence=agent_data.get("confidence_score"),
+        scam_detected=agent_data.get("scam_detected"),
+        suspicious_phrases=suspicious_phrases,
+        tier=tier,
+    )
+
+@dataclass
+class _TurnRequest:
+    session_id: str
+    message: HistoryMessage
+    history_items: List[HistoryMessage]
+    started: float
+    # Timestamps as the client sent them (None where one was filled in), message first
+    client_timestamps: List[int | None]
+
+    @property
+    def fingerprint(self) -> str | None:
+        # Same session, inbound message and client history means a duplicate
+        # (retried) request. Filled-in timestamps differ on every retry, so
+        # only the client's own count. A bare message (no client timestamp,
+        # no history) cannot be told apart from the sender repeating it, e.g.
+        # "ok" twice, so such requests are never coalesced (None).
+        if self.client_timestamps[0] is None and not self.history_items:
+            return None
+        messages = [self.message, *self.history_items]
+        parts = [self.session_id] + [[m.sender, m.text, ts] for m, ts in zip(messages, self.client_timestamps)]
+        return hashlib.sha256(json.dumps(parts, ensure_ascii=False).encode("utf-8")).hexdigest()
+
+@dataclass
+class _Turn:
+    session_id: str
+    message: HistoryMessage
+    history_items: List[HistoryMessage]
+    history: List[str]
+    intel_state: Dict
+    persona_facts: List[str]
+    context: str
+    started: float
+
+    @property
+    def deadline(self) -> Deadline:
+        return Deadline(TURN_DEADLINE_SECONDS, started=self.started)
+
+async def _parse_turn_request(request: Request, x_api_key: str | None) -> _TurnRequest:
+    """
+    Auth and request parsing; nothing is read from or written to the session yet.
+    """
     if API_KEY and x_api_key != API_KEY:
         logging.warning("Auth failed. Expected %s, got %s", API_KEY, x_api_key)
         raise HTTPException(status_code=401, detail="Unauthorized")
 
+    turn_started = time.monotonic()
     payload = await _read_json_or_empty(request)
     session_id = (
         payload.get("sessionId")
@@ -98,43 +225,74 @@ async def _handle_message_universal(
 
     history_raw = payload.get("conversationHistory") or payload.get("conversation_history")
     history_items = []
+    client_timestamps = [_client_timestamp(message_raw)]
     if isinstance(history_raw, list):
         for item in history_raw:
             history_items.append(_coerce_message(item, fallback_text=""))
+            client_timestamps.append(_client_timestamp(item))
+    return _TurnRequest(session_id, message, history_items, turn_started, client_timestamps)
 
-    # 1. Resolve history (client-provided overrides server state)
-    if history_items:
-        set_history(session_id, history_items)
-    else:
-        history_items = get_history(session_id)
-
-    append_message(session_id, message)
-    history_items.append(message)
-    history = [
-        f"{m.sender}: {m.text}" if m.sender else m.text
-        for m in history_items
-    ]
-
-    # Maintain persona memory across turns
-    persona_facts = extract_persona_facts_from_history(history)
-    update_persona_facts(session_id, persona_facts)
-    persona_facts = get_persona_facts(session_id)
-    
-    # 2. Get AI analysis
-    logging.info("History passed to LLM: %s", history)
-    try:
-        agent_data = generate_agent_response(history, persona_facts=persona_facts)
-    except Exception:
-        logging.exception("Agent response failed; using safe fallback reply.")
-        agent_data = {
-            "scam_detected": False,
-            "confidence_score": 0.0,
-            "agent_mode": "monitoring",
-            "agent_reply": SAFE_FALLBACK_REPLY,
-            "extracted_intelligence": extract_intelligence_from_history(history),
-            "risk_analysis": {"exposure_risk": "low", "reasoning": "Fallback due to agent error"},
-        }
-    
+async def _prepare_turn(incoming: _TurnRequest) -> _Turn:
+    """
+    Everything before the LLM call that touches the session: history and intel
+    state. Call it while holding the session's lock.
+    """
+    session_id = incoming.session_id
+
+    # 1. Resolve history (client-provided overrides server state) and record
+    # the inbound message in a single Redis round trip. Persona facts are
+    # kept by the store, which updates them from new honeypot messages only
+    view, intel_state, persona_facts = await load_and_append(
+        session_id, incoming.message, history=incoming.history_items or None
+    )
+    # The store keeps each line formatted alongside its message
+    history_items, history = view.messages, view.lines
+
+    # Scan only the messages added since the last turn for intel, and fold
+    # turns that left the verbatim window into the session summary
+    intel_state = update_intel_state(intel_state, history_items)
+    intel_state = update_context_summary(intel_state, history_items)
+    context = build_context(intel_state, history_items, persona_facts)
+    logging.info("Context passed to LLM: %s", context)
+    return _Turn(session_id, incoming.message, history_items, history, intel_state, persona_facts, context, incoming.started)
+
+def _fallback_agent_data(intel: dict) -> dict:
+    return {
+        "scam_detected": False,
+        "confidence_score": 0.0,
+        "agent_mode": "monitoring",
+        "agent_reply": SAFE_FALLBACK_REPLY,
+        "extracted_intelligence": intel,
+        "risk_analysis": {"exposure_risk": "low", "reasoning": "Fallback due to agent error"},
+    }
+
+def _fast_path_data(turn: _Turn) -> dict | None:
+    # Trivial turns are answered from templates without an LLM round trip
+    tier = FAST_PATH.classify(turn.message.text, turn.intel_state)
+    if tier == "llm":
+        return None
+    agent_data = local_agent_response(turn.history, turn.intel_state["intel"], f"Fast path: {tier}")
+    agent_data["fast_path"] = tier
+    return agent_data
+
+def _final_reply(turn: _Turn, agent_data: dict) -> str:
+    # 4. Return the EXACT keys required by Section 8
+    reply_text = agent_data.get("agent_reply") or SAFE_FALLBACK_REPLY
+
+    # Hard guard: avoid repeating the exact same honeypot reply
+    last_honeypot = ""
+    for item in reversed(turn.history_items):
+        if getattr(item, "sender", "").lower() == "honeypot":
+            last_honeypot = item.text or ""
+            break
+    if last_honeypot and reply_text.strip().lower() == last_honeypot.strip().lower():
+        reply_text = reply_text.rstrip(". ") + ". Also, can you share the official helpline or IFSC code?"
+    return reply_text
+
+async def _finish_turn(turn: _Turn, agent_data: dict, reply_text: str) -> None:
+    """
+    Everything after the reply is known: persistence, callback and logging.
+    """
     # 3. Mandatory Callback Trigger
     # Rule: Send if scam is confirmed AND we have at least 5 messages
     extracted = agent_data.get("extracted_intelligence", {})
@@ -148,62 +306,169 @@ async def _handle_message_universal(
         "wallet_addresses",
     ])
 
-    should_callback = agent_data.get("scam_detected") and (len(history) >= 5 or has_intel)
-    if should_callback and mark_callback_sent(session_id):
-        send_final_callback(
-            session_id=session_id,
-            history=history,
-            intelligence=extracted,
-            notes=agent_data.get("reasoning"),
-            risk_analysis=agent_data.get("risk_analysis"),
-        )
-
-    # 4. Return the EXACT keys required by Section 8
-    reply_text = agent_data.get("agent_reply") or SAFE_FALLBACK_REPLY
+    should_callback = bool(agent_data.get("scam_detected") and (len(turn.history) >= 5 or has_intel))
+    if agent_data.get("scam_detected"):
+        # Flagged sessions never take the fast path again
+        turn.intel_state["scam_detected"] = True
 
-    # Hard guard: avoid repeating the exact same honeypot reply
-    last_honeypot = ""
-    for item in reversed(history_items):
-        if getattr(item, "sender", "").lower() == "honeypot":
-            last_honeypot = item.text or ""
-            break
-    if last_honeypot and reply_text.strip().lower() == last_honeypot.strip().lower():
-        reply_text = reply_text.rstrip(". ") + ". Also, can you share the official helpline or IFSC code?"
-    reply_message = MessageContent(
+    reply_message = HistoryMessage(
         sender="honeypot",
         text=reply_text,
         timestamp=int(time.time() * 1000),
     )
-    append_message(session_id, reply_message)
+    # Store the reply and claim the callback flag in one round trip
+    if await commit_turn(turn.session_id, reply_message, mark_callback=should_callback, intel_state=turn.intel_state):
+        # Only queued here; the dispatcher delivers it in the background
+        await enqueue_final_callback(
+            session_id=turn.session_id,
+            history=turn.history,
+            intelligence=extracted,
+            notes=agent_data.get("reasoning"),
+            risk_analysis=agent_data.get("risk_analysis"),
+        )
 
-    # Log incoming and outgoing messages to CSV
-    log_message_event(
-        session_id=session_id,
-        sender=message.sender,
-        message=message.text,
-        intel=extracted,
-        confidence=agent_data.get("confidence_score"),
-        scam_detected=agent_data.get("scam_detected"),
-        suspicious_phrases=suspicious_phrases,
-    )
-    log_message_event(
-        session_id=session_id,
-        sender="honeypot",
-        message=reply_text,
-        intel=extracted,
-        confidence=agent_data.get("confidence_score"),
-        scam_detected=agent_data.get("scam_detected"),
+    # Log incoming and outgoing messages to CSV (queued for the background writer)
+    _log_turn(
+        session_id=turn.session_id,
+        inbound=turn.message,
+        reply_text=reply_text,
+        agent_data=agent_data,
         suspicious_phrases=suspicious_phrases,
     )
 
-    # Simulated typing delay to reduce bot-like responses and smooth rate limits
-    time.sleep(0.4)
+async def _run_turn(incoming: _TurnRequest) -> tuple:
+    async with SESSION_LOCKS.hold(incoming.session_id):
+        turn = await _prepare_turn(incoming)
+
+        # 2. Get AI analysis
+        agent_data = _fast_path_data(turn)
+        if agent_data is None:
+            try:
+                agent_data = await generate_agent_response(
+                    turn.history,
+                    persona_facts=turn.persona_facts,
+                    intel=turn.intel_state["intel"],
+                    deadline=turn.deadline,
+                    context=turn.context,
+                )
+            except Exception:
+                logging.exception("Agent response failed; using safe fallback reply.")
+                agent_data = _fallback_agent_data(turn.intel_state["intel"])
+
+        reply_text = _final_reply(turn, agent_data)
+        await _finish_turn(turn, agent_data, reply_text)
+    return reply_text, agent_data
+
+async def _handle_message_universal(
+    request: Request,
+    x_api_key: str | None,
+):
+    incoming = await _parse_turn_request(request, x_api_key)
+    reply_text, _ = await _turns_in_flight.run(incoming.fingerprint, lambda: _run_turn(incoming))
+
+    # Simulated typing delay to reduce bot-like responses and smooth rate limits.
+    # LLM time already spent counts toward the session's window.
+    await wait_for_typing_window(incoming.session_id, incoming.started)
 
     return {
         "status": "success",
         "reply": reply_text
     }
 
+def _sse(event: str, data: dict) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+def _done_event(reply_text: str, agent_data: dict) -> str:
+    return _sse("done", {
+        "status": "success",
+        "reply": reply_text,
+        "scamDetected": bool(agent_data.get("scam_detected")),
+        "confidenceScore": agent_data.get("confidence_score"),
+        "agentMode": agent_data.get("agent_mode"),
+        "extractedIntelligence": agent_data.get("extracted_intelligence", {}),
+        "riskAnalysis": agent_data.get("risk_analysis") or {},
+    })
+
+async def _finish_in_background(turn: _Turn, lease: SessionLease, agent_data: dict, reply_text: str) -> None:
+    try:
+        await _finish_turn(turn, agent_data, reply_text)
+    finally:
+        await SESSION_LOCKS.release(lease)
+
+async def _stream_turn(incoming: _TurnRequest) -> AsyncIterator[str]:
+    # A retry of a turn that is still running gets that turn's reply in one piece
+    try:
+        joined = await _turns_in_flight.join(incoming.fingerprint)
+    except Exception:
+        # The stream has already started: answer like a failed agent call
+        logging.exception("Joined turn failed; using safe fallback reply.")
+        joined = (SAFE_FALLBACK_REPLY, _fallback_agent_data({}))
+    if joined is not None:
+        reply_text, agent_data = joined
+        yield _sse("token", {"text": reply_text})
+        yield _done_event(reply_text, agent_data)
+        return
+
+    flight = _turns_in_flight.start(incoming.fingerprint)
+    lease = None
+    try:
+        lease = await SESSION_LOCKS.acquire(incoming.session_id)
+        turn = await _prepare_turn(incoming)
+        streamed = ""
+        agent_data = _fast_path_data(turn)
+        if agent_data is None:
+            try:
+                async for event in stream_agent_response(
+                    turn.history,
+                    persona_facts=turn.persona_facts,
+                    intel=turn.intel_state["intel"],
+                    deadline=turn.deadline,
+                    context=turn.context,
+                ):
+                    if event["type"] == "token":
+                        streamed += event["text"]
+                        yield _sse("token", {"text": event["text"]})
+                    elif event["type"] == "field":
+                        yield _sse("field", {event["key"]: event["value"]})
+                    else:
+                        agent_data = event["data"]
+            except Exception:
+                logging.exception("Agent stream failed; using safe fallback reply.")
+        if agent_data is None:
+            agent_data = _fallback_agent_data(turn.intel_state["intel"])
+
+        reply_text = _final_reply(turn, agent_data)
+        if reply_text.startswith(streamed) and len(reply_text) > len(streamed):
+            yield _sse("token", {"text": reply_text[len(streamed):]})
+
+        # Persist and log off the response path, still holding the session;
+        # the finished task is awaited on shutdown
+        task = asyncio.create_task(_finish_in_background(turn, lease, agent_data, reply_text))
+        lease = None
+        _turn_tasks.add(task)
+        task.add_done_callback(_turn_tasks.discard)
+        _turns_in_flight.finish(incoming.fingerprint, flight, (reply_text, agent_data))
+    except BaseException as exc:
+        _turns_in_flight.finish(incoming.fingerprint, flight, error=exc)
+        raise
+    finally:
+        if lease is not None:
+            await SESSION_LOCKS.release(lease)
+
+    yield _done_event(reply_text, agent_data)
+
+@app.post("/honeypot/message/stream")
+async def handle_message_stream(
+    request: Request,
+    x_api_key: str | None = Header(None, alias="x-api-key"),
+):
+    incoming = await _parse_turn_request(request, x_api_key)
+    return StreamingResponse(
+        _stream_turn(incoming),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
 @app.post("/honeypot/message", response_model=HoneypotResponse)
 async def handle_message(
     request: Request,
@@ -1,56 +1,238 @@
-from collections import defaultdict
+from collections import OrderedDict, deque
 from threading import Lock
+from typing import Callable, Dict, List
+import json
 import time
 
-from config import MAX_HISTORY
-from schemas import MessageContent
+from config import MAX_HISTORY, MEMORY_MAX_SESSIONS, MEMORY_IDLE_TTL_SECONDS, MEMORY_MAX_BYTES, MEMORY_OUTBOX_MAX
+from schemas import HistoryMessage
 
 _lock = Lock()
 
-conversations = defaultdict(lambda: {
-    "history": [],
-    "start_time": time.monotonic(),
-    "persona_facts": [],
-    "extracted": {
-        "bank_accounts": [],
-        "upi_ids": [],
-        "phishing_urls": [],
-        "ifsc_codes": [],
-        "wallet_addresses": []
-    }
-})
-
-def add_message(conversation_id: str, message: MessageContent) -> dict:
-    with _lock:
-        convo = conversations[conversation_id]
+# Rough per-object overheads (CPython, 64-bit) for the byte estimate
+_SESSION_OVERHEAD = 600
+_MESSAGE_OVERHEAD = 150
+_STRING_OVERHEAD = 50
+
+def _estimate_size(convo: dict) -> int:
+    size = _SESSION_OVERHEAD
+    for message in convo["history"]:
+        size += _MESSAGE_OVERHEAD + len(message.sender) + len(message.text)
+    for fact in convo["persona_facts"]:
+        size += _STRING_OVERHEAD + len(str(fact))
+    if convo.get("intel_state"):
+        size += 2 * len(json.dumps(convo["intel_state"], separators=(",", ":")))
+    return size
+
+class SessionStore:
+    """
+    Per-session fallback state, bounded three ways: at most `max_sessions`
+    sessions, none idle for longer than `idle_ttl` seconds, and an estimated
+    `max_bytes` in total (0 disables a bound). The least recently used
+    sessions are evicted first. Reads never create a session. Callers must
+    hold `_lock`.
+    """
+
+    def __init__(self, max_sessions: int, idle_ttl: float, max_bytes: int):
+        self.max_sessions = max_sessions
+        self.idle_ttl = idle_ttl
+        self.max_bytes = max_bytes
+        # session_id -> (last_used, estimated bytes, state), least recently used first
+        self._sessions: "OrderedDict[str, list]" = OrderedDict()
+        self.bytes = 0
+        # Called with the session_id of every evicted session
+        self.on_evict: Callable[[str], None] | None = None
+        self.counters: Dict[str, int] = {"evicted_capacity": 0, "evicted_idle": 0, "evicted_bytes": 0}
+
+    def get(self, session_id: str) -> dict | None:
+        entry = self._sessions.get(session_id)
+        if entry is None:
+            return None
+        now = time.monotonic()
+        if self.idle_ttl and now - entry[0] > self.idle_ttl:
+            self._evict(session_id, "evicted_idle")
+            return None
+        entry[0] = now
+        self._sessions.move_to_end(session_id)
+        return entry[2]
+
+    def get_or_create(self, session_id: str) -> dict:
+        convo = self.get(session_id)
+        if convo is None:
+            convo = {"history": [], "start_time": time.monotonic(), "persona_facts": []}
+            self._sessions[session_id] = [time.monotonic(), 0, convo]
+        return convo
+
+    def updated(self, session_id: str) -> None:
+        """
+        Re-measures a session after a write, then evicts whatever the bounds require.
+        """
+        entry = self._sessions.get(session_id)
+        if entry is not None:
+            size = _estimate_size(entry[2])
+            self.bytes += size - entry[1]
+            entry[1] = size
+        self._enforce(keep=session_id)
+
+    def _evict(self, session_id: str, reason: str) -> None:
+        entry = self._sessions.pop(session_id)
+        self.bytes -= entry[1]
+        self.counters[reason] += 1
+        if self.on_evict:
+            self.on_evict(session_id)
+
+    def _enforce(self, keep: str) -> None:
+        now = time.monotonic()
+        while self._sessions:
+            oldest, entry = next(iter(self._sessions.items()))
+            if self.idle_ttl and now - entry[0] > self.idle_ttl:
+                reason = "evicted_idle"
+            elif self.max_sessions and len(self._sessions) > self.max_sessions:
+                reason = "evicted_capacity"
+            elif self.max_bytes and self.bytes > self.max_bytes and oldest != keep:
+                reason = "evicted_bytes"
+            else:
+                break
+            self._evict(oldest, reason)
+
+    def __contains__(self, session_id: str) -> bool:
+        return session_id in self._sessions
+
+    def metrics(self) -> Dict:
+        return {
+            "sessions": len(self._sessions),
+            "max_sessions": self.max_sessions,
+            "bytes": self.bytes,
+            "max_bytes": self.max_bytes,
+            "idle_ttl_seconds": self.idle_ttl,
+            **self.counters,
+        }
+
+conversations = SessionStore(MEMORY_MAX_SESSIONS, MEMORY_IDLE_TTL_SECONDS, MEMORY_MAX_BYTES)
+
+def add_message(conversation_id: str, message: HistoryMessage) -> None:
+    with _lock:
+        convo = conversations.get_or_create(conversation_id)
         convo["history"].append(message)
 
         if MAX_HISTORY and len(convo["history"]) > MAX_HISTORY:
             convo["history"] = convo["history"][-MAX_HISTORY:]
+        conversations.updated(conversation_id)
 
-        return convo
+def replace_history(conversation_id: str, messages: List[HistoryMessage]) -> None:
+    with _lock:
+        history = list(messages)
+        if MAX_HISTORY and len(history) > MAX_HISTORY:
+            history = history[-MAX_HISTORY:]
+        conversations.get_or_create(conversation_id)["history"] = history
+        conversations.updated(conversation_id)
+
+def clear_history(conversation_id: str) -> None:
+    with _lock:
+        convo = conversations.get(conversation_id)
+        if convo is not None:
+            convo["history"] = []
+            conversations.updated(conversation_id)
 
 def get_history(conversation_id: str) -> list:
     with _lock:
-        return list(conversations[conversation_id]["history"])
+        convo = conversations.get(conversation_id)
+        return list(convo["history"]) if convo else []
 
-def get_start_time(conversation_id: str) -> float:
+def get_start_time(conversation_id: str) -> float | None:
     with _lock:
-        return conversations[conversation_id]["start_time"]
+        convo = conversations.get(conversation_id)
+        return convo["start_time"] if convo else None
 
-def update_persona_facts(conversation_id: str, facts: list) -> list:
+def update_persona_facts(conversation_id: str, facts: list, limit: int = 0) -> list:
     with _lock:
-        convo = conversations[conversation_id]
+        convo = conversations.get_or_create(conversation_id)
         existing = convo.get("persona_facts", [])
         seen = {str(f).lower() for f in existing}
         for fact in facts:
             key = str(fact).lower()
+            if limit and len(existing) >= limit:
+                break
             if key and key not in seen:
                 existing.append(fact)
                 seen.add(key)
         convo["persona_facts"] = existing
+        conversations.updated(conversation_id)
         return list(existing)
 
 def get_persona_facts(conversation_id: str) -> list:
     with _lock:
-        return list(conversations[conversation_id].get("persona_facts", []))
+        convo = conversations.get(conversation_id)
+        return list(convo.get("persona_facts", [])) if convo else []
+
+def get_intel_state(conversation_id: str) -> dict | None:
+    with _lock:
+        convo = conversations.get(conversation_id)
+        state = convo.get("intel_state") if convo else None
+        return dict(state) if state else None
+
+def set_intel_state(conversation_id: str, state: dict) -> None:
+    with _lock:
+        conversations.get_or_create(conversation_id)["intel_state"] = dict(state)
+        conversations.updated(conversation_id)
+
+def mark_callback(conversation_id: str) -> bool:
+    """
+    Returns True if we just marked it, False if it was already marked.
+    """
+    with _lock:
+        convo = conversations.get_or_create(conversation_id)
+        if convo.get("callback_sent"):
+            return False
+        convo["callback_sent"] = True
+        conversations.updated(conversation_id)
+        return True
+
+def callback_sent(conversation_id: str) -> bool:
+    with _lock:
+        convo = conversations.get(conversation_id)
+        return bool(convo and convo.get("callback_sent"))
+
+def set_evict_hook(hook: Callable[[str], None] | None) -> None:
+    conversations.on_evict = hook
+
+def metrics() -> Dict:
+    with _lock:
+        return {**conversations.metrics(), "outbox": len(outbox), "outbox_dropped": outbox_dropped}
+
+# Callback outbox used while Redis is unavailable
+outbox = deque()
+outbox_dropped = 0
+
+def _trim_outbox() -> list:
+    global outbox_dropped
+    dropped = []
+    while MEMORY_OUTBOX_MAX and len(outbox) > MEMORY_OUTBOX_MAX:
+        dropped.append(outbox.popleft())
+    outbox_dropped += len(dropped)
+    return dropped
+
+def outbox_push(payload: dict) -> list:
+    """
+    Queues a payload; returns the oldest payloads dropped to stay within
+    MEMORY_OUTBOX_MAX.
+    """
+    with _lock:
+        outbox.append(payload)
+        return _trim_outbox()
+
+def outbox_restore(payloads: list) -> list:
+    """
+    Puts popped payloads that were not delivered back at the front, in order.
+    Returns any payloads dropped to stay within MEMORY_OUTBOX_MAX.
+    """
+    with _lock:
+        outbox.extendleft(reversed(payloads))
+        return _trim_outbox()
+
+def outbox_pop(count: int) -> list:
+    with _lock:
+        items = []
+        while outbox and len(items) < count:
+            items.append(outbox.popleft())
+        return items
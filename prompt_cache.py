@@ -0,0 +1,141 @@
+import asyncio
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, List, Tuple
+
+from config import PROMPT_CACHE_ENABLED, PROMPT_CACHE_SIZE, PROMPT_CACHE_TTL_SECONDS, PROMPT_CACHE_REDIS
+from redis_store import prompt_cache_get, prompt_cache_set
+
+
+def prompt_key(model: str, temperature: float, messages: List[Dict[str, Any]]) -> str:
+    canonical = json.dumps(
+        {"model": model, "temperature": temperature, "messages": messages},
+        sort_keys=True,
+        ensure_ascii=False,
+        separators=(",", ":"),
+    )
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()
+
+
+class PromptCache:
+    """
+    Content-addressed cache of raw LLM answers. Entries live in an in-process
+    LRU (and in Redis when `shared`) for `ttl` seconds. Concurrent misses on
+    the same key wait for the first caller's request instead of sending their own.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, shared: bool = False, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.shared = shared
+        self.enabled = enabled and max_entries > 0
+        self._entries: "OrderedDict[str, Tuple[float, str]]" = OrderedDict()
+        self._in_flight: Dict[str, asyncio.Future] = {}
+        self.counters: Dict[str, int] = {"hits": 0, "shared_hits": 0, "coalesced": 0, "misses": 0}
+
+    def _local_get(self, key: str) -> str | None:
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        if time.monotonic() - entry[0] > self.ttl:
+            del self._entries[key]
+            return None
+        self._entries.move_to_end(key)
+        return entry[1]
+
+    def _local_put(self, key: str, value: str) -> None:
+        self._entries[key] = (time.monotonic(), value)
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    async def get(self, key: str) -> str | None:
+        if not self.enabled:
+            return None
+        value = self._local_get(key)
+        if value is not None:
+            self.counters["hits"] += 1
+            return value
+        if self.shared:
+            value = await prompt_cache_get(key)
+            if value is not None:
+                self.counters["shared_hits"] += 1
+                self._local_put(key, value)
+                return value
+        return None
+
+    async def put(self, key: str, value: str) -> None:
+        # Empty answers are failures in disguise; let the next request retry
+        if not self.enabled or not value:
+            return
+        self._local_put(key, value)
+        if self.shared:
+            await prompt_cache_set(key, value, int(self.ttl))
+
+    async def get_or_call(self, key: str, make_call: Callable[[], Awaitable[str]], timeout: float | None = None) -> str:
+        """
+        Cached answer for `key`, or the result of `make_call()`. Callers that
+        join an in-flight request wait at most `timeout` seconds for it and
+        get its error if it fails.
+        """
+        if not self.enabled:
+            return await make_call()
+        while True:
+            cached = await self.get(key)
+            if cached is not None:
+                return cached
+            pending = self._in_flight.get(key)
+            if pending is None:
+                break
+            try:
+                value = await asyncio.wait_for(asyncio.shield(pending), timeout)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                # The first caller went away; take over the request
+                continue
+            self.counters["coalesced"] += 1
+            return value
+
+        self.counters["misses"] += 1
+        future = asyncio.get_running_loop().create_future()
+        self._in_flight[key] = future
+        try:
+            value = await make_call()
+        except asyncio.CancelledError:
+            future.cancel()
+            raise
+        except BaseException as exc:
+            future.set_exception(exc)
+            # Joiners re-raise it; mark it retrieved so an unjoined failure is not logged twice
+            future.exception()
+            raise
+        else:
+            future.set_result(value)
+            await self.put(key, value)
+            return value
+        finally:
+            if self._in_flight.get(key) is future:
+                del self._in_flight[key]
+
+    def metrics(self) -> Dict:
+        lookups = sum(self.counters.values())
+        served = lookups - self.counters["misses"]
+        return {
+            "enabled": self.enabled,
+            "shared": self.shared,
+            "entries": len(self._entries),
+            "in_flight": len(self._in_flight),
+            **self.counters,
+            "hit_rate": round(served / lookups, 4) if lookups else 0.0,
+        }
+
+
+PROMPT_CACHE = PromptCache(
+    PROMPT_CACHE_SIZE,
+    PROMPT_CACHE_TTL_SECONDS,
+    shared=PROMPT_CACHE_REDIS,
+    enabled=PROMPT_CACHE_ENABLED,
+)
@@ -1,16 +1,85 @@
+import asyncio
+import hashlib
+import inspect
 import json
-from typing import List
+import logging
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Dict, Iterable, List, Tuple, TypeVar
 
-import redis
+import redis.asyncio as redis
 from redis.exceptions import ConnectionError as RedisConnectionError
+from redis.exceptions import TimeoutError as RedisTimeoutError
 
-from config import REDIS_URL
-from schemas import MessageContent
+from config import (
+    REDIS_URL,
+    MAX_HISTORY,
+    HISTORY_TTL_SECONDS,
+    ARCHIVE_SWEEP_SECONDS,
+    ARCHIVE_GRACE_SECONDS,
+    REDIS_SOCKET_TIMEOUT,
+    REDIS_FAILURE_THRESHOLD,
+    REDIS_RESET_TIMEOUT_SECONDS,
+    CALLBACK_CLAIM_IDLE_MS,
+    HISTORY_CODEC,
+)
+from schemas import HistoryMessage, HistoryView
+from extract_intel import MAX_PERSONA_FACTS, extract_persona_facts, merge_intel
 from memory import add_message as mem_add_message
 from memory import get_history as mem_get_history
-from memory import conversations as mem_conversations
+from memory import replace_history as mem_replace_history
+from memory import clear_history as mem_clear_history
+from memory import mark_callback as mem_mark_callback
+from memory import callback_sent as mem_callback_sent
+from memory import set_evict_hook as mem_set_evict_hook
+from memory import get_intel_state as mem_get_intel_state
+from memory import set_intel_state as mem_set_intel_state
+from memory import update_persona_facts as mem_update_persona_facts
+from memory import get_persona_facts as mem_get_persona_facts
+from memory import outbox_push as mem_outbox_push
+from memory import outbox_pop as mem_outbox_pop
+from memory import outbox_restore as mem_outbox_restore
 
-_client = redis.Redis.from_url(REDIS_URL, decode_responses=True)
+try:
+    import msgpack
+except Exception:
+    msgpack = None
+
+_client = redis.Redis.from_url(
+    REDIS_URL,
+    decode_responses=True,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+)
+# Reads that return stored messages; they may be msgpack, so no text decoding
+_raw_client = redis.Redis.from_url(
+    REDIS_URL,
+    decode_responses=False,
+    socket_connect_timeout=REDIS_SOCKET_TIMEOUT,
+    socket_timeout=REDIS_SOCKET_TIMEOUT,
+)
+logger = logging.getLogger(__name__)
+T = TypeVar("T")
+_REDIS_DOWN_ERRORS = (RedisConnectionError, RedisTimeoutError, OSError)
+
+# Sessions by last activity; only maintained while an archive hook is set
+_INDEX_KEY = "honeypot:sessions:last_seen"
+
+# Callback outbox stream, its consumer group and the dead-letter stream
+_OUTBOX_KEY = "honeypot:callback_outbox"
+_OUTBOX_GROUP = "dispatchers"
+_DEAD_LETTER_KEY = "honeypot:callback_dead"
+_outbox_group_ready = False
+
+# Shared exact-prompt LLM cache entries
+_PROMPT_CACHE_PREFIX = "honeypot:prompt_cache:"
+
+# Cross-worker per-session turn leases
+_LEASE_PREFIX = "honeypot:session_lease:"
+
+ArchiveHook = Callable[[str, List[HistoryMessage]], Awaitable[None] | None]
+_archive_hook: ArchiveHook | None = None
 
 
 def _key(session_id: str) -> str:
@@ -19,77 +88,946 @@ def _key(session_id: str) -> str:
 def _callback_key(session_id: str) -> str:
     return f"honeypot:callback_sent:{session_id}"
 
+def _state_key(session_id: str) -> str:
+    return f"honeypot:session:{session_id}"
+
+def _persona_key(session_id: str) -> str:
+    return f"honeypot:persona:{session_id}"
+
+
+# Shared tail of every write script: trim the list to MAX_HISTORY, slide the
+# TTL of the history, callback, state and persona keys and, when archiving,
+# bump the session in the last-seen index.
+# KEYS: history, callback, index, state, persona. ARGV[1..4]: max, ttl, now ("" = no index), session_id
+_TOUCH_LUA = """
+local function touch()
+    local max = tonumber(ARGV[1])
+    local ttl = tonumber(ARGV[2])
+    if max > 0 then
+        redis.call('LTRIM', KEYS[1], -max, -1)
+    end
+    if ttl > 0 then
+        redis.call('EXPIRE', KEYS[1], ttl)
+        if redis.call('EXISTS', KEYS[2]) == 1 then
+            redis.call('EXPIRE', KEYS[2], ttl)
+        end
+        if redis.call('EXISTS', KEYS[4]) == 1 then
+            redis.call('EXPIRE', KEYS[4], ttl)
+        end
+        if redis.call('EXISTS', KEYS[5]) == 1 then
+            redis.call('EXPIRE', KEYS[5], ttl)
+        end
+    end
+    if ARGV[3] ~= '' then
+        redis.call('ZADD', KEYS[3], ARGV[3], ARGV[4])
+    end
+end
+"""
+
+# History marker, kept in the state hash: hist_total is the number of
+# messages ever pushed (trimming does not lower it) and hist_chain a hash
+# chain over their digests, both computed by the caller. A write moves the
+# marker from the exact value the caller expected to the caller's new value,
+# or drops it so the next client-provided history is written in full. A
+# session with no list yet counts as the empty marker.
+_MARKER_LUA = """
+local function marker_matches(expected_total, expected_chain)
+    local total = redis.call('HGET', KEYS[4], 'hist_total')
+    local chain = redis.call('HGET', KEYS[4], 'hist_chain')
+    if not total and redis.call('EXISTS', KEYS[1]) == 0 then
+        total, chain = '0', ''
+    end
+    return total == expected_total and chain == expected_chain, total, chain
+end
+local function set_marker(matched, new_total, new_chain)
+    if matched then
+        redis.call('HSET', KEYS[4], 'hist_total', new_total, 'hist_chain', new_chain)
+    else
+        redis.call('HDEL', KEYS[4], 'hist_total', 'hist_chain')
+    end
+end
+"""
+
+# Persona facts, kept in their own hash (lowercased fact -> fact). Facts are
+# only ever added, first writer wins, up to MAX_PERSONA_FACTS per session.
+_PERSONA_LUA = f"""
+local function add_persona_facts(packed)
+    for fact in string.gmatch(packed, '[^\\n]+') do
+        if redis.call('HLEN', KEYS[5]) >= {MAX_PERSONA_FACTS} then
+            break
+        end
+        redis.call('HSETNX', KEYS[5], string.lower(fact), fact)
+    end
+end
+"""
+
+# Write the history and return {written, stored list, intel state, marker,
+# persona facts}.
+# ARGV[5] is the mode: "append" pushes onto whatever is stored, "delta"
+# pushes a suffix only if the stored marker is the expected one (otherwise
+# nothing is written and written is 0), "replace" rewrites the list.
+# ARGV[6..7] expected marker, ARGV[8..9] new marker. ARGV[10] is "1" when the
+# caller already holds the list for the expected marker; the list is then
+# only returned if the marker did not match. ARGV[11] persona facts found in
+# the pushed honeypot messages (newline-separated). ARGV[12..] messages to push.
+_LOAD_AND_APPEND = _client.register_script(_TOUCH_LUA + _MARKER_LUA + _PERSONA_LUA + """
+local matched, total, chain = marker_matches(ARGV[6], ARGV[7])
+if ARGV[5] == 'delta' and not matched then
+    return {0, false, false, total, chain}
+end
+if ARGV[5] == 'replace' then
+    redis.call('DEL', KEYS[1])
+end
+for i = 12, #ARGV do
+    redis.call('RPUSH', KEYS[1], ARGV[i])
+end
+set_marker(matched or ARGV[5] == 'replace', ARGV[8], ARGV[9])
+add_persona_facts(ARGV[11])
+touch()
+local items = false
+if not (ARGV[10] == '1' and matched) and ARGV[5] ~= 'replace' then
+    items = redis.call('LRANGE', KEYS[1], 0, -1)
+end
+return {
+    1,
+    items,
+    redis.call('HGET', KEYS[4], 'intel'),
+    redis.call('HGET', KEYS[4], 'hist_total'),
+    redis.call('HGET', KEYS[4], 'hist_chain'),
+    redis.call('HVALS', KEYS[5]),
+}
+""")
+
+# Append the honeypot reply, store the intel state (ARGV[7], "" = keep) and,
+# if requested, claim the callback flag. ARGV[8..9] expected marker ("" when
+# unknown, which drops the stored one), ARGV[10..11] new marker, ARGV[12]
+# persona facts found in the reply. Returns {written, whether this call set
+# the flag (1/0), resulting marker}; nothing is written when a known
+# expected marker does not match.
+_COMMIT_TURN = _client.register_script(_TOUCH_LUA + _MARKER_LUA + _PERSONA_LUA + """
+local matched, total, chain = marker_matches(ARGV[8], ARGV[9])
+if not matched and ARGV[8] ~= '' then
+    return {0, 0, total, chain}
+end
+redis.call('RPUSH', KEYS[1], ARGV[5])
+set_marker(matched, ARGV[10], ARGV[11])
+local marked = 0
+if ARGV[6] == '1' then
+    marked = redis.call('SETNX', KEYS[2], '1')
+end
+if ARGV[7] ~= '' then
+    redis.call('HSET', KEYS[4], 'intel', ARGV[7])
+end
+add_persona_facts(ARGV[12])
+touch()
+return {1, marked, redis.call('HGET', KEYS[4], 'hist_total'), redis.call('HGET', KEYS[4], 'hist_chain')}
+""")
+
+# Delete a session lease only if this holder still owns it
+# KEYS: lease. ARGV: token
+_RELEASE_LEASE = _client.register_script("""
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+""")
+
+# Claim an idle session for archiving: only succeeds if it is still idle,
+# so a turn that lands concurrently keeps its data. Returns the history.
+# KEYS: index, history, callback, state, persona. ARGV: session_id, cutoff
+_CLAIM_IDLE = _client.register_script("""
+local score = redis.call('ZSCORE', KEYS[1], ARGV[1])
+if not score or tonumber(score) > tonumber(ARGV[2]) then
+    return false
+end
+redis.call('ZREM', KEYS[1], ARGV[1])
+local items = redis.call('LRANGE', KEYS[2], 0, -1)
+redis.call('DEL', KEYS[2], KEYS[3], KEYS[4], KEYS[5])
+return items
+""")
+
+
+def _key_ttl() -> int:
+    if HISTORY_TTL_SECONDS <= 0:
+        return 0
+    # Leave the sweeper time to archive before Redis drops the keys
+    if _archive_hook is not None:
+        return HISTORY_TTL_SECONDS + ARCHIVE_GRACE_SECONDS
+    return HISTORY_TTL_SECONDS
+
+def _touch_keys(session_id: str) -> List[str]:
+    return [_key(session_id), _callback_key(session_id), _INDEX_KEY, _state_key(session_id), _persona_key(session_id)]
+
+def _touch_args(session_id: str) -> List[str]:
+    now = str(time.time()) if _archive_hook is not None else ""
+    return [str(MAX_HISTORY or 0), str(_key_ttl()), now, session_id]
+
+
+def _history_codec() -> str:
+    if HISTORY_CODEC == "msgpack" and msgpack is None:
+        # Fail at startup rather than store rows other workers expect in msgpack as JSON
+        raise ValueError("HISTORY_CODEC=msgpack needs the msgpack package (pip install msgpack).")
+    return HISTORY_CODEC if HISTORY_CODEC in ("json", "msgpack") else "json"
 
-def get_history(session_id: str) -> List[MessageContent]:
+_CODEC = _history_codec()
+
+def _encode(message: HistoryMessage) -> str | bytes:
+    record = (message.sender, message.text, message.timestamp)
+    if _CODEC == "msgpack":
+        return msgpack.packb(record, unicode_errors="surrogatepass")
+    return json.dumps(record, separators=(",", ":"))
+
+def _decode_message(raw: bytes | str) -> HistoryMessage | None:
+    # Every format ever written stays readable: JSON objects (the original
+    # format), compact JSON arrays and msgpack arrays
     try:
-        items = _client.lrange(_key(session_id), 0, -1)
-        result: List[MessageContent] = []
-        for raw in items:
-            try:
-                payload = json.loads(raw)
-            except json.JSONDecodeError:
-                continue
+        first = raw[:1]
+        if first in (b"[", "["):
+            sender, text, timestamp = json.loads(raw)
+        elif first in (b"{", "{"):
+            payload = json.loads(raw)
+            sender, text, timestamp = payload["sender"], payload["text"], payload["timestamp"]
+        elif msgpack is not None:
+            if isinstance(raw, str):
+                raw = raw.encode("utf-8", "surrogatepass")
+            sender, text, timestamp = msgpack.unpackb(raw, unicode_errors="surrogatepass")
+        else:
+            return None
+        return HistoryMessage(str(sender), str(text), int(timestamp))
+    except Exception:
+        return None
+
+def _decode_history(items: List[bytes | str]) -> List[HistoryMessage]:
+    result: List[HistoryMessage] = []
+    for raw in items:
+        message = _decode_message(raw)
+        if message is not None:
+            result.append(message)
+    return result
+
+def _text(raw: bytes | str | None) -> str | None:
+    return raw.decode("utf-8") if isinstance(raw, bytes) else raw
+
+def _encode_state(state: dict | None) -> str:
+    return json.dumps(state, separators=(",", ":")) if state else ""
+
+def _decode_state(raw: str | bytes | None) -> dict | None:
+    if not raw:
+        return None
+    try:
+        state = json.loads(raw)
+    except json.JSONDecodeError:
+        return None
+    return state if isinstance(state, dict) else None
+
+# Per session, the last history marker (hist_total, hist_chain) this worker
+# saw and, when known, the stored list it describes. Only a hint: a stale
+# entry costs one extra round trip (or one full read), never a wrong write.
+_history_markers: "OrderedDict[str, Tuple[int, str]]" = OrderedDict()
+_history_views: Dict[str, HistoryView] = {}
+_MAX_CACHED_MARKERS = 10000
+_EMPTY_MARKER = (0, "")
+
+def _digest(message: HistoryMessage) -> str:
+    # Timestamps are left out: the client's copy of a reply carries its own
+    return hashlib.sha1(f"{message.sender}\x00{message.text}".encode("utf-8", "surrogatepass")).hexdigest()
+
+def _extend_chain(chain: str, digests: Iterable[str]) -> str:
+    for digest in digests:
+        chain = hashlib.sha1((chain + digest).encode("ascii")).hexdigest()
+    return chain
+
+def _persona_facts(messages: Iterable[HistoryMessage]) -> List[str]:
+    # Only the honeypot's own messages describe its persona
+    return extract_persona_facts("\n".join(m.text for m in messages if m.sender.lower() == "honeypot"))
+
+def _remember_marker(session_id: str, total: str | bytes | None, chain: str | bytes | None, view: HistoryView | None = None) -> None:
+    if total is None:
+        _forget_marker(session_id)
+        return
+    _history_markers[session_id] = (int(total), _text(chain) or "")
+    _history_markers.move_to_end(session_id)
+    if view is not None:
+        _history_views[session_id] = view
+    else:
+        _history_views.pop(session_id, None)
+    while len(_history_markers) > _MAX_CACHED_MARKERS:
+        evicted, _ = _history_markers.popitem(last=False)
+        _history_views.pop(evicted, None)
+
+async def _stored_marker(session_id: str) -> Tuple[int, str] | None:
+    # Not seen by this worker yet: a small read beats losing the marker
+    total, chain = await _client.hmget(_state_key(session_id), "hist_total", "hist_chain")
+    return (int(total), chain or "") if total is not None else None
+
+def _forget_marker(session_id: str) -> None:
+    _history_markers.pop(session_id, None)
+    _history_views.pop(session_id, None)
+
+def _plan_history_write(
+    history: List[HistoryMessage],
+    appended: List[HistoryMessage],
+    marker: Tuple[int, str] | None,
+) -> Tuple[str, List[HistoryMessage], Tuple[int, str]]:
+    """
+    How to store the client's full `history` followed by `appended`: as a
+    "delta" (only what follows the stored prefix, when `marker` matches the
+    start of `history`) or a full "replace". Returns (mode, messages to push,
+    new marker).
+    """
+    digests = [_digest(m) for m in history]
+    start, base = 0, ""
+    if marker is not None and marker[0] <= len(digests):
+        prefix = _extend_chain("", digests[:marker[0]])
+        if prefix == marker[1]:
+            start, base = marker[0], prefix
+    mode = "delta" if marker is not None and start == marker[0] else "replace"
+    pushed = history[start:] + appended
+    chain = _extend_chain(base, digests[start:] + [_digest(m) for m in appended])
+    return mode, pushed, (start + len(pushed), chain)
+
+def _mem_history(session_id: str) -> List[HistoryMessage]:
+    result: List[HistoryMessage] = []
+    for msg in mem_get_history(session_id):
+        if isinstance(msg, HistoryMessage):
+            result.append(msg)
+        elif isinstance(msg, dict):
             try:
-                result.append(MessageContent(**payload))
-            except Exception:
+                result.append(HistoryMessage(str(msg["sender"]), str(msg["text"]), int(msg["timestamp"])))
+            except (KeyError, TypeError, ValueError):
                 continue
-        return result
-    except RedisConnectionError:
-        # Fallback to in-memory store if Redis is unavailable
-        result: List[MessageContent] = []
-        for msg in mem_get_history(session_id):
-            if isinstance(msg, MessageContent):
-                result.append(msg)
-            elif isinstance(msg, dict):
-                try:
-                    result.append(MessageContent(**msg))
-                except Exception:
-                    continue
-            else:
-                result.append(MessageContent(sender="user", text=str(msg), timestamp=0))
-        return result
+        else:
+            result.append(HistoryMessage("user", str(msg), 0))
+    return result
+
+
+class _CircuitBreaker:
+    """
+    Shared by every redis_store call. After `failure_threshold` consecutive
+    connection failures the circuit opens and calls go straight to the
+    in-memory fallback; after `reset_timeout` seconds one call is let through
+    as a half-open probe, which either closes or re-opens the circuit. A
+    probe with no outcome after another `reset_timeout` is given up on and a
+    new one is let through.
+    """
+
+    def __init__(self, failure_threshold: int, reset_timeout: float):
+        self.failure_threshold = max(1, failure_threshold)
+        self.reset_timeout = reset_timeout
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probe_at = 0.0
+        self.on_close: Callable[[], None] | None = None
+
+    def allow(self) -> bool:
+        if self.state == "closed":
+            return True
+        now = time.monotonic()
+        if self.state == "open" and now - self.opened_at >= self.reset_timeout:
+            self.state = "half_open"
+            self.probe_at = now
+            return True
+        if self.state == "half_open" and now - self.probe_at >= self.reset_timeout:
+            # The probe never reported back (e.g. it was cancelled); re-arm
+            self.probe_at = now
+            return True
+        # Open, or a half-open probe is already in flight
+        return False
+
+    def record_success(self) -> None:
+        recovered = self.state != "closed"
+        self.state = "closed"
+        self.failures = 0
+        if recovered:
+            logger.info("Redis reachable again; circuit closed.")
+            if self.on_close:
+                self.on_close()
+
+    def record_failure(self) -> None:
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.failure_threshold:
+            if self.state != "open":
+                logger.warning("Redis unreachable; circuit open for %.1fs.", self.reset_timeout)
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
 
+_breaker = _CircuitBreaker(REDIS_FAILURE_THRESHOLD, REDIS_RESET_TIMEOUT_SECONDS)
 
-def append_message(session_id: str, message: MessageContent) -> None:
+# Sessions written to memory while Redis was down: session_id -> replaced
+# (True when the in-memory history is a full client-provided replacement
+# rather than a tail of new messages).
+_pending_sync: Dict[str, bool] = {}
+# Flushes in progress; a turn for the same session waits for its flush
+_flushing: Dict[str, asyncio.Future] = {}
+_reconcile_task: asyncio.Task | None = None
+
+
+async def _call(op: Callable[[], Awaitable[T]], fallback: Callable[[], T]) -> T:
+    if not _breaker.allow():
+        return fallback()
     try:
-        _client.rpush(_key(session_id), json.dumps(message.model_dump()))
-    except RedisConnectionError:
-        mem_add_message(session_id, message)
+        result = await op()
+    except _REDIS_DOWN_ERRORS:
+        _breaker.record_failure()
+        return fallback()
+    except Exception:
+        # Redis answered (e.g. a script error), so it is reachable
+        _breaker.record_success()
+        raise
+    except BaseException:
+        # A cancelled probe tells us nothing; re-open rather than leave the
+        # circuit half-open with no probe in flight
+        if _breaker.state == "half_open":
+            _breaker.record_failure()
+        raise
+    _breaker.record_success()
+    return result
+
+def _mark_pending(session_id: str, replaced: bool = False) -> None:
+    _pending_sync[session_id] = _pending_sync.get(session_id, False) or replaced
+
+def _merge_states(stored: dict | None, state: dict) -> dict:
+    # The memory state only covers messages handled during the outage and
+    # its cursor is already past the older ones, so keep the intel Redis
+    # held for them. The summary and cursor are the newer memory ones.
+    if not stored:
+        return state
+    merged = {**stored, **state}
+    merged["intel"] = merge_intel(stored.get("intel"), state.get("intel"))
+    merged["scam_detected"] = bool(stored.get("scam_detected") or state.get("scam_detected"))
+    return merged
 
+async def _flush_session(session_id: str) -> None:
+    """
+    Pushes a session written during an outage back into Redis. If Redis fails
+    again the session stays pending and the error propagates. A call for a
+    session that is already being flushed waits for that flush instead.
+    """
+    while session_id in _flushing:
+        pending = _flushing[session_id]
+        try:
+            await asyncio.shield(pending)
+        except asyncio.CancelledError:
+            if not pending.cancelled():
+                raise
+            # The flushing task was cancelled; flush it here
+            continue
+        return
+    replaced = _pending_sync.get(session_id)
+    if replaced is None:
+        return
+    future = asyncio.get_running_loop().create_future()
+    _flushing[session_id] = future
+    messages = _mem_history(session_id)
+    callback_sent = mem_callback_sent(session_id)
+    state = mem_get_intel_state(session_id)
+    facts = mem_get_persona_facts(session_id)
+    _forget_marker(session_id)
+    try:
+        stored, total, chain = await _client.hmget(_state_key(session_id), "intel", "hist_total", "hist_chain")
+        if state:
+            state = _merge_states(_decode_state(stored), state)
+        if replaced:
+            mode, _, marker = _plan_history_write(messages, [], None)
+            expected = ("", "")
+        else:
+            # Outage-era messages extend the stored marker, or drop it if
+            # another writer moves it first
+            mode, expected = "append", (total or "", chain or "")
+            marker = ("", "")
+            if total is not None:
+                marker = (int(total) + len(messages), _extend_chain(chain or "", [_digest(m) for m in messages]))
+        args = _touch_args(session_id) + [mode, expected[0], expected[1], str(marker[0]), marker[1], "0", "\n".join(facts)]
+        args.extend(_encode(m) for m in messages)
+        pipeline = _raw_client.pipeline()
+        if messages or replaced or facts:
+            await _LOAD_AND_APPEND(keys=_touch_keys(session_id), args=args, client=pipeline)
+        if state:
+            pipeline.hset(_state_key(session_id), "intel", _encode_state(state))
+        if callback_sent:
+            pipeline.set(_callback_key(session_id), "1", nx=True, ex=_key_ttl() or None)
+        await pipeline.execute()
+    except asyncio.CancelledError:
+        future.cancel()
+        raise
+    except BaseException as exc:
+        future.set_exception(exc)
+        # Waiters re-raise it; mark it retrieved so an unjoined failure is not logged twice
+        future.exception()
+        raise
+    else:
+        # Only now may turns skip the flush. Redis is the source of truth
+        # again; keep only non-history memory state
+        _pending_sync.pop(session_id, None)
+        mem_clear_history(session_id)
+        future.set_result(None)
+    finally:
+        if _flushing.get(session_id) is future:
+            del _flushing[session_id]
 
-def set_history(session_id: str, messages: List[MessageContent]) -> None:
+async def _reconcile() -> None:
+    flushed = 0
+    for session_id in list(_pending_sync):
+        try:
+            await _flush_session(session_id)
+        except _REDIS_DOWN_ERRORS:
+            _breaker.record_failure()
+            logger.warning("Reconciliation interrupted; %d sessions still pending.", len(_pending_sync))
+            return
+        flushed += 1
+    if flushed:
+        logger.info("Reconciled %d in-memory sessions back to Redis.", flushed)
+
+def _schedule_reconcile() -> None:
+    global _reconcile_task
+    if not _pending_sync or (_reconcile_task and not _reconcile_task.done()):
+        return
     try:
-        key = _key(session_id)
-        pipeline = _client.pipeline()
-        pipeline.delete(key)
-        if messages:
-            pipeline.rpush(key, *[json.dumps(m.model_dump()) for m in messages])
-        pipeline.execute()
-    except RedisConnectionError:
+        _reconcile_task = asyncio.get_running_loop().create_task(_reconcile())
+    except RuntimeError:
+        # No running loop; the next session access flushes on demand
+        pass
+
+def _drop_evicted(session_id: str) -> None:
+    # The memory store is bounded; an evicted outage session has nothing left to flush
+    if _pending_sync.pop(session_id, None) is not None:
+        logger.warning("Session %s evicted from memory before Redis recovered; its outage turns are lost.", session_id)
+
+_breaker.on_close = _schedule_reconcile
+mem_set_evict_hook(_drop_evicted)
+
+async def _ensure_synced(session_id: str) -> None:
+    # A session touched during the outage must be back in Redis before we
+    # read or extend it there, or the outage turns would be lost
+    if session_id in _pending_sync:
+        await _flush_session(session_id)
+
+
+async def get_history(session_id: str) -> List[HistoryMessage]:
+    async def op():
+        await _ensure_synced(session_id)
+        return _decode_history(await _raw_client.lrange(_key(session_id), 0, -1))
+
+    # Fallback to in-memory store if Redis is unavailable
+    return await _call(op, lambda: _mem_history(session_id))
+
+
+async def _write_history(
+    session_id: str,
+    history: List[HistoryMessage] | None,
+    appended: List[HistoryMessage],
+) -> Tuple[HistoryView, bytes | None, List[str]]:
+    """
+    Stores `appended` after the client's full `history`, or after whatever is
+    stored when `history` is None. Only messages Redis does not already hold
+    are sent; the list is rewritten only when the stored history diverged.
+    The stored list is only read back when this worker's cached view of it
+    is missing or stale. Persona facts from the honeypot messages actually
+    pushed are added to the session's persona hash. Returns the resulting
+    view, the raw intel state and the session's persona facts.
+    """
+    marker: Tuple[int, str] | None = _history_markers.get(session_id)
+    view = _history_views.get(session_id) if marker is not None else None
+    if marker is None:
+        marker = await _stored_marker(session_id)
+    retried = False
+    while True:
+        if history is None:
+            # Extend a known marker only if it is still the stored one; with
+            # none (new or legacy session) just append
+            base = marker or _EMPTY_MARKER
+            mode, pushed = ("delta" if marker is not None else "append"), appended
+            new = (base[0] + len(appended), _extend_chain(base[1], [_digest(m) for m in appended]))
+        else:
+            mode, pushed, new = _plan_history_write(history, appended, marker)
+        expected = marker or _EMPTY_MARKER
+        args = _touch_args(session_id) + [mode, str(expected[0]), expected[1], str(new[0]), new[1]]
+        args.append("1" if view is not None else "0")
+        args.append("\n".join(_persona_facts(pushed)))
+        args.extend(_encode(m) for m in pushed)
+        written, items, state, total, chain, *persona = await _LOAD_AND_APPEND(
+            keys=_touch_keys(session_id), args=args, client=_raw_client
+        )
+        if written:
+            if items:
+                view = HistoryView(_decode_history(items))
+            elif mode == "replace" or view is None:
+                view = HistoryView(pushed[-MAX_HISTORY:] if MAX_HISTORY else pushed)
+            else:
+                view = view.extended(pushed, MAX_HISTORY)
+            _remember_marker(session_id, total, chain, view)
+            return view, state, [_text(fact) for fact in persona[0]]
+        # Another writer moved the marker: plan once more from the stored
+        # one, then fall back to a full rewrite (or a plain append)
+        marker = (int(total), _text(chain) or "") if total is not None and not retried else None
+        view = None
+        retried = True
+
+
+async def load_and_append(
+    session_id: str,
+    message: HistoryMessage,
+    history: List[HistoryMessage] | None = None,
+) -> Tuple[HistoryView, dict | None, List[str]]:
+    """
+    One round trip per turn: syncs the stored history with the one the client
+    sent (appending only the new suffix when the stored copy is a prefix of
+    it), appends the inbound message and returns the full history together
+    with the session's incremental intel state (None if there is none yet)
+    and its persona facts.
+    """
+    async def op():
+        await _ensure_synced(session_id)
+        view, state, facts = await _write_history(session_id, history or None, [message])
+        return view, _decode_state(state), facts
+
+    def fallback():
+        if history:
+            mem_replace_history(session_id, history)
+            mem_update_persona_facts(session_id, _persona_facts(history), limit=MAX_PERSONA_FACTS)
+        mem_add_message(session_id, message)
+        _mark_pending(session_id, replaced=bool(history))
+        return HistoryView(_mem_history(session_id)), mem_get_intel_state(session_id), mem_get_persona_facts(session_id)
+
+    return await _call(op, fallback)
+
+
+async def commit_turn(
+    session_id: str,
+    reply: HistoryMessage,
+    mark_callback: bool = False,
+    intel_state: dict | None = None,
+) -> bool:
+    """
+    One round trip per turn: appends the honeypot reply, stores the updated
+    intel state, adds any persona facts the reply states and optionally claims
+    the callback flag. Returns True if this call claimed the flag.
+    """
+    async def op():
+        await _ensure_synced(session_id)
+        marker = _history_markers.get(session_id)
+        view = _history_views.get(session_id) if marker is not None else None
+        if marker is None:
+            marker = await _stored_marker(session_id)
+        retried = False
+        while True:
+            # Without a known marker the stored one cannot be extended and is dropped
+            expected = marker or ("", "")
+            new = (marker[0] + 1, _extend_chain(marker[1], [_digest(reply)])) if marker else ("", "")
+            written, marked, total, chain = await _COMMIT_TURN(
+                keys=_touch_keys(session_id),
+                args=_touch_args(session_id) + [
+                    _encode(reply),
+                    "1" if mark_callback else "0",
+                    _encode_state(intel_state),
+                    str(expected[0]),
+                    expected[1],
+                    str(new[0]),
+                    new[1],
+                    "\n".join(_persona_facts([reply])),
+                ],
+                client=_raw_client,
+            )
+            if written:
+                break
+            # Another writer moved the marker: retry once from the stored one
+            marker = (int(total), _text(chain) or "") if total is not None and not retried else None
+            view = None
+            retried = True
+        # The cached view is still exact only if nobody else wrote in between
+        if view is not None and total is not None and (int(total), _text(chain)) == new:
+            view = view.extended([reply], MAX_HISTORY)
+        else:
+            view = None
+        _remember_marker(session_id, total, chain, view)
+        return bool(marked)
+
+    def fallback():
+        mem_add_message(session_id, reply)
+        mem_update_persona_facts(session_id, _persona_facts([reply]), limit=MAX_PERSONA_FACTS)
+        if intel_state:
+            mem_set_intel_state(session_id, intel_state)
+        _mark_pending(session_id)
+        return mem_mark_callback(session_id) if mark_callback else False
+
+    return await _call(op, fallback)
+
+
+async def append_message(session_id: str, message: HistoryMessage) -> None:
+    async def op():
+        await _ensure_synced(session_id)
+        await _write_history(session_id, None, [message])
+
+    def fallback():
+        mem_add_message(session_id, message)
+        _mark_pending(session_id)
+
+    await _call(op, fallback)
+
+
+async def set_history(session_id: str, messages: List[HistoryMessage]) -> None:
+    async def op():
+        # The client's history supersedes any outage-era memory copy; what is
+        # already in Redis is kept when it is a prefix of it
+        _pending_sync.pop(session_id, None)
+        await _write_history(session_id, messages, [])
+
+    def fallback():
         # Replace in-memory history
-        mem_conversations[session_id]["history"] = list(messages)
+        mem_replace_history(session_id, messages)
+        _mark_pending(session_id, replaced=True)
+
+    await _call(op, fallback)
 
-def mark_callback_sent(session_id: str) -> bool:
+async def mark_callback_sent(session_id: str) -> bool:
     """
     Returns True if we just marked it, False if it was already marked.
     """
-    try:
-        return _client.setnx(_callback_key(session_id), "1")
-    except RedisConnectionError:
-        convo = mem_conversations[session_id]
-        if convo.get("callback_sent"):
-            return False
-        convo["callback_sent"] = True
-        return True
-
-def callback_already_sent(session_id: str) -> bool:
-    try:
-        return _client.exists(_callback_key(session_id)) == 1
-    except RedisConnectionError:
-        return bool(mem_conversations[session_id].get("callback_sent"))
+    async def op():
+        await _ensure_synced(session_id)
+        ttl = _key_ttl()
+        return bool(await _client.set(_callback_key(session_id), "1", nx=True, ex=ttl or None))
+
+    def fallback():
+        _mark_pending(session_id)
+        return mem_mark_callback(session_id)
+
+    return await _call(op, fallback)
+
+async def callback_already_sent(session_id: str) -> bool:
+    async def op():
+        if session_id in _pending_sync and mem_callback_sent(session_id):
+            return True
+        return await _client.exists(_callback_key(session_id)) == 1
+
+    return await _call(op, lambda: mem_callback_sent(session_id))
+
+async def redis_available() -> bool:
+    """
+    Circuit-breaker view of Redis: False while the circuit is open, otherwise
+    a ping (which doubles as the half-open probe).
+    """
+    async def op():
+        return bool(await _client.ping())
+
+    return await _call(op, lambda: False)
+
+
+async def outbox_add(payload: Dict[str, Any]) -> None:
+    """
+    Durably queues a callback payload (Redis stream, or memory while Redis is down).
+    """
+    encoded = json.dumps(payload)
+
+    async def op():
+        await _client.xadd(_OUTBOX_KEY, {"payload": encoded})
+
+    _log_dropped(await _call(op, lambda: mem_outbox_push(payload)))
+
+
+def _log_dropped(dropped: List[Dict[str, Any]] | None) -> None:
+    for payload in dropped or []:
+        logger.error("Memory callback outbox full; dropped: %s", json.dumps(payload))
+
+
+def outbox_requeue(payloads: List[Dict[str, Any]]) -> None:
+    """
+    Returns memory-queued payloads (entry_id None) whose delivery did not
+    finish to the front of the memory outbox.
+    """
+    if payloads:
+        _log_dropped(mem_outbox_restore(payloads))
+
+
+async def outbox_spill() -> int:
+    """
+    Moves payloads queued in memory into the Redis stream, so they outlive
+    this process. Returns how many were moved; they stay in memory if Redis
+    is unreachable.
+    """
+    payloads = mem_outbox_pop(sys.maxsize)
+    if not payloads:
+        return 0
+
+    async def op():
+        pipeline = _client.pipeline()
+        for payload in payloads:
+            pipeline.xadd(_OUTBOX_KEY, {"payload": json.dumps(payload)})
+        await pipeline.execute()
+        return len(payloads)
+
+    def fallback():
+        outbox_requeue(payloads)
+        return 0
 
-def redis_available() -> bool:
     try:
-        return _client.ping()
-    except RedisConnectionError:
-        return False
+        return await _call(op, fallback)
+    except BaseException:
+        outbox_requeue(payloads)
+        raise
+
+
+async def outbox_read(consumer: str, count: int = 10) -> List[Tuple[str | None, Dict[str, Any]]]:
+    """
+    Returns up to `count` (entry_id, payload) pairs for this consumer: entries
+    abandoned by a crashed consumer first, then new ones. Entries that were
+    queued in memory during an outage have an entry_id of None.
+    """
+    entries: List[Tuple[str | None, Dict[str, Any]]] = [(None, p) for p in mem_outbox_pop(count)]
+    if len(entries) >= count:
+        return entries
+
+    async def op():
+        global _outbox_group_ready
+        if not _outbox_group_ready:
+            try:
+                await _client.xgroup_create(_OUTBOX_KEY, _OUTBOX_GROUP, id="0", mkstream=True)
+            except redis.ResponseError as exc:
+                if "BUSYGROUP" not in str(exc):
+                    raise
+            _outbox_group_ready = True
+        wanted = count - len(entries)
+        claimed = await _client.xautoclaim(
+            _OUTBOX_KEY, _OUTBOX_GROUP, consumer, CALLBACK_CLAIM_IDLE_MS, "0-0", count=wanted
+        )
+        raw = list(claimed[1])
+        if len(raw) < wanted:
+            response = await _client.xreadgroup(
+                _OUTBOX_GROUP, consumer, {_OUTBOX_KEY: ">"}, count=wanted - len(raw)
+            )
+            for _, stream_entries in response or []:
+                raw.extend(stream_entries)
+        return raw
+
+    for entry_id, fields in await _call(op, lambda: []):
+        try:
+            entries.append((entry_id, json.loads(fields["payload"])))
+        except (KeyError, TypeError, json.JSONDecodeError):
+            logger.error("Dropping malformed outbox entry %s", entry_id)
+            await outbox_ack(entry_id)
+    return entries
+
+
+async def outbox_ack(entry_id: str | None) -> None:
+    if entry_id is None:
+        return
+
+    async def op():
+        pipeline = _client.pipeline()
+        pipeline.xack(_OUTBOX_KEY, _OUTBOX_GROUP, entry_id)
+        pipeline.xdel(_OUTBOX_KEY, entry_id)
+        await pipeline.execute()
+
+    await _call(op, lambda: None)
+
+
+async def outbox_dead_letter(entry_id: str | None, payload: Dict[str, Any], error: str) -> None:
+    """
+    Parks a payload that exhausted its retries and removes it from the outbox.
+    """
+    async def op():
+        pipeline = _client.pipeline()
+        pipeline.xadd(
+            _DEAD_LETTER_KEY,
+            {"payload": json.dumps(payload), "error": error, "failed_at": str(time.time())},
+            maxlen=10000,
+            approximate=True,
+        )
+        if entry_id is not None:
+            pipeline.xack(_OUTBOX_KEY, _OUTBOX_GROUP, entry_id)
+            pipeline.xdel(_OUTBOX_KEY, entry_id)
+        await pipeline.execute()
+
+    def fallback():
+        logger.error("Callback dead-lettered while Redis is down: %s (%s)", json.dumps(payload), error)
+
+    await _call(op, fallback)
+
+
+async def prompt_cache_get(key: str) -> str | None:
+    async def op():
+        return await _client.get(_PROMPT_CACHE_PREFIX + key)
+
+    return await _call(op, lambda: None)
+
+
+async def prompt_cache_set(key: str, value: str, ttl: int) -> None:
+    async def op():
+        await _client.set(_PROMPT_CACHE_PREFIX + key, value, ex=max(1, ttl))
+
+    await _call(op, lambda: None)
+
+
+async def acquire_session_lease(session_id: str, token: str, lease_ms: int, wait_seconds: float) -> bool | None:
+    """
+    Takes the session's cross-worker lease, polling until `wait_seconds` run
+    out. Returns True once held, False if another holder kept it and None
+    while Redis is down.
+    """
+    async def op():
+        return bool(await _client.set(_LEASE_PREFIX + session_id, token, nx=True, px=max(1, lease_ms)))
+
+    give_up = time.monotonic() + wait_seconds
+    while True:
+        acquired = await _call(op, lambda: None)
+        if acquired is not False or time.monotonic() >= give_up:
+            return acquired
+        await asyncio.sleep(0.05)
+
+
+async def release_session_lease(session_id: str, token: str) -> None:
+    async def op():
+        await _RELEASE_LEASE(keys=[_LEASE_PREFIX + session_id], args=[token])
+
+    await _call(op, lambda: None)
+
+
+def set_archive_hook(hook: ArchiveHook | None) -> None:
+    """
+    Registers a callable(session_id, history) that receives sessions idle for
+    longer than HISTORY_TTL_SECONDS before they are removed from Redis.
+    """
+    global _archive_hook
+    _archive_hook = hook
+
+async def archive_idle_sessions(limit: int = 100) -> int:
+    if _archive_hook is None or HISTORY_TTL_SECONDS <= 0:
+        return 0
+    cutoff = time.time() - HISTORY_TTL_SECONDS
+    session_ids = await _call(
+        lambda: _client.zrangebyscore(_INDEX_KEY, "-inf", cutoff, start=0, num=limit),
+        lambda: [],
+    )
+    archived = 0
+    for session_id in session_ids:
+        try:
+            items = await _CLAIM_IDLE(
+                keys=[_INDEX_KEY, _key(session_id), _callback_key(session_id), _state_key(session_id), _persona_key(session_id)],
+                args=[session_id, cutoff],
+                client=_raw_client,
+            )
+        except _REDIS_DOWN_ERRORS:
+            _breaker.record_failure()
+            break
+        if items is None:
+            continue
+        try:
+            result = _archive_hook(session_id, _decode_history(items))
+            if inspect.isawaitable(result):
+                await result
+            archived += 1
+        except Exception:
+            logger.exception("Archive hook failed for session %s", session_id)
+    return archived
+
+async def run_archive_sweeper(interval: float = ARCHIVE_SWEEP_SECONDS) -> None:
+    while True:
+        try:
+            archived = await archive_idle_sessions()
+            if archived:
+                logger.info("Archived %d idle sessions", archived)
+        except Exception:
+            logger.exception("Archive sweep failed")
+        await asyncio.sleep(interval)
@@ -8,7 +8,7 @@ try:
     from pydantic.version import VERSION as PYDANTIC_VERSION
 except Exception:
     PYDANTIC_VERSION = "1"
-from typing import List, Optional
+from typing import Iterable, List, NamedTuple, Optional
 
 # Matches the "message" object in the tester's JSON
 class MessageContent(BaseModel):
@@ -55,3 +55,34 @@ class MessageRequest(BaseModel):
 class HoneypotResponse(BaseModel):
     status: str = "success"
     reply: str
+
+# Internal record of a stored message. The pydantic models above are for the
+# API boundary; history moves through the store and the agent as these tuples.
+class HistoryMessage(NamedTuple):
+    sender: str
+    text: str
+    timestamp: int  # Epoch time in ms
+
+    @property
+    def line(self) -> str:
+        return f"{self.sender}: {self.text}" if self.sender else self.text
+
+class HistoryView:
+    """
+    A session's stored messages together with their "sender: text" prompt
+    lines, so each line is formatted once rather than on every turn. Treat
+    both lists as read-only; extended() returns a new view.
+    """
+    __slots__ = ("messages", "lines")
+
+    def __init__(self, messages: Iterable[HistoryMessage] = (), lines: List[str] | None = None):
+        self.messages = list(messages)
+        self.lines = lines if lines is not None else [m.line for m in self.messages]
+
+    def extended(self, messages: Iterable[HistoryMessage], limit: int = 0) -> "HistoryView":
+        messages = list(messages)
+        combined = self.messages + messages
+        lines = self.lines + [m.line for m in messages]
+        if limit and len(combined) > limit:
+            combined, lines = combined[-limit:], lines[-limit:]
+        return HistoryView(combined, lines)
@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+import uuid
+from contextlib import asynccontextmanager
+from typing import Any, Awaitable, Callable, Dict
+
+from config import SESSION_LOCK_TIMEOUT_SECONDS, SESSION_LEASE_REDIS, SESSION_LEASE_MS
+from redis_store import acquire_session_lease, release_session_lease
+
+logger = logging.getLogger(__name__)
+
+
+class SessionLease:
+    """
+    One turn's hold on a session. `local` / `shared` record which of the two
+    locks were actually taken.
+    """
+
+    __slots__ = ("session_id", "token", "local", "shared", "released")
+
+    def __init__(self, session_id: str):
+        self.session_id = session_id
+        self.token = uuid.uuid4().hex
+        self.local = False
+        self.shared = False
+        self.released = False
+
+
+class SessionLocks:
+    """
+    Runs turns for the same session one at a time: an asyncio.Lock per
+    session in this process and, when `shared`, a Redis lease so other
+    workers wait too. Locks are dropped once no turn holds or waits for them.
+    A turn that waits longer than `timeout` proceeds without the lock.
+    """
+
+    def __init__(self, timeout: float, lease_ms: int, shared: bool = False):
+        self.timeout = timeout
+        self.lease_ms = lease_ms
+        self.shared = shared
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._users: Dict[str, int] = {}
+        self.counters: Dict[str, int] = {"acquired": 0, "contended": 0, "timed_out": 0}
+
+    async def acquire(self, session_id: str) -> SessionLease:
+        lease = SessionLease(session_id)
+        lock = self._locks.setdefault(session_id, asyncio.Lock())
+        self._users[session_id] = self._users.get(session_id, 0) + 1
+        started = time.monotonic()
+        if self._users[session_id] > 1:
+            self.counters["contended"] += 1
+        ordered = False
+        try:
+            await asyncio.wait_for(lock.acquire(), self.timeout)
+            lease.local = ordered = True
+            if self.shared:
+                wait = max(0.0, self.timeout - (time.monotonic() - started))
+                held = await acquire_session_lease(session_id, lease.token, self.lease_ms, wait)
+                lease.shared = bool(held)
+                # With Redis down there is nothing to coordinate with; local order still holds
+                ordered = held is not False
+        except asyncio.TimeoutError:
+            pass
+        except BaseException:
+            await self.release(lease)
+            raise
+        if ordered:
+            self.counters["acquired"] += 1
+        else:
+            self.counters["timed_out"] += 1
+            logger.warning("Session %s still busy after %.1fs; running turn unordered", session_id, self.timeout)
+        return lease
+
+    async def release(self, lease: SessionLease) -> None:
+        if lease.released:
+            return
+        lease.released = True
+        session_id = lease.session_id
+        if lease.shared:
+            await release_session_lease(session_id, lease.token)
+        if lease.local:
+            self._locks[session_id].release()
+        self._users[session_id] -= 1
+        if not self._users[session_id]:
+            del self._users[session_id]
+            del self._locks[session_id]
+
+    @asynccontextmanager
+    async def hold(self, session_id: str):
+        lease = await self.acquire(session_id)
+        try:
+            yield lease
+        finally:
+            await self.release(lease)
+
+    def metrics(self) -> Dict:
+        return {
+            "shared": self.shared,
+            "active_sessions": len(self._locks),
+            "waiting": sum(self._users.values()) - sum(lock.locked() for lock in self._locks.values()),
+            **self.counters,
+        }
+
+
+class SingleFlight:
+    """
+    Collapses concurrent calls with the same key onto the first one. Callers
+    that join get its result or its error; if the first caller is cancelled,
+    a joiner runs the call itself. Calls with a None key are never shared.
+    """
+
+    def __init__(self):
+        self._calls: Dict[str, asyncio.Future] = {}
+        self.coalesced = 0
+
+    async def join(self, key: str | None) -> Any:
+        """
+        Result of the in-flight call for `key`, or None if there is none.
+        Does not yield to the event loop when nothing is in flight.
+        """
+        while True:
+            pending = self._calls.get(key)
+            if pending is None:
+                return None
+            try:
+                result = await asyncio.shield(pending)
+            except asyncio.CancelledError:
+                if not pending.cancelled():
+                    raise
+                continue
+            self.coalesced += 1
+            return result
+
+    def start(self, key: str | None) -> asyncio.Future:
+        future = asyncio.get_running_loop().create_future()
+        if key is not None:
+            self._calls[key] = future
+        return future
+
+    def finish(self, key: str | None, future: asyncio.Future, result: Any = None, error: BaseException | None = None) -> None:
+        if self._calls.get(key) is future:
+            del self._calls[key]
+        if future.done():
+            return
+        if error is None:
+            future.set_result(result)
+        elif isinstance(error, (asyncio.CancelledError, GeneratorExit)):
+            future.cancel()
+        else:
+            future.set_exception(error)
+            # Mark it retrieved so a failure nobody joined is not logged again
+            future.exception()
+
+    async def run(self, key: str | None, make_call: Callable[[], Awaitable[Any]]) -> Any:
+        result = await self.join(key)
+        if result is not None:
+            return result
+        future = self.start(key)
+        try:
+            result = await make_call()
+        except BaseException as exc:
+            self.finish(key, future, error=exc)
+            raise
+        self.finish(key, future, result)
+        return result
+
+    def __len__(self) -> int:
+        return len(self._calls)
+
+
+SESSION_LOCKS = SessionLocks(SESSION_LOCK_TIMEOUT_SECONDS, SESSION_LEASE_MS, shared=SESSION_LEASE_REDIS)
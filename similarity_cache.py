@@ -0,0 +1,173 @@
+import hashlib
+import itertools
+import random
+import re
+import time
+from collections import OrderedDict
+from threading import Lock
+from typing import Dict, List, Set, Tuple
+
+from config import (
+    SIMILARITY_CACHE_ENABLED,
+    SIMILARITY_CACHE_SIZE,
+    SIMILARITY_CACHE_TTL_SECONDS,
+    SIMILARITY_THRESHOLD,
+    SIMILARITY_MIN_WORDS,
+)
+
+# Identifiers differ between victims of the same campaign; mask them so the
+# script itself is what gets compared
+_MASKS = [
+    (re.compile(r"https?://\S+|www\.\S+", re.IGNORECASE), " urltoken "),
+    (re.compile(r"[\w.-]+@[\w.-]+"), " idtoken "),
+    (re.compile(r"\d[\d\s-]*\d|\d"), " numtoken "),
+]
+_WORDS = re.compile(r"\w+")
+# 128 permutations banded 32 x 4: anything near the threshold is almost
+# surely a candidate, and candidates are then checked against the threshold
+# (the estimate's standard error is about 0.04 at 128 permutations)
+_PERMUTATIONS = 128
+_ROWS = 4
+_PRIME = (1 << 61) - 1
+_rng = random.Random(0x5CA3)
+_COEFFICIENTS = [(_rng.randrange(1, _PRIME), _rng.randrange(_PRIME)) for _ in range(_PERMUTATIONS)]
+
+
+def _normalize(text: str) -> List[str]:
+    text = text.lower()
+    for pattern, replacement in _MASKS:
+        text = pattern.sub(replacement, text)
+    return _WORDS.findall(text)
+
+
+def minhash(words: List[str]) -> Tuple[int, ...]:
+    """
+    MinHash signature over the set of words and adjacent word pairs.
+    """
+    features = set(words) | {f"{a} {b}" for a, b in zip(words, words[1:])}
+    values = [
+        int.from_bytes(hashlib.blake2b(feature.encode("utf-8"), digest_size=8).digest(), "big")
+        for feature in features
+    ]
+    return tuple(min((a * value + b) % _PRIME for value in values) for a, b in _COEFFICIENTS)
+
+
+def _bands(signature: Tuple[int, ...]) -> List[Tuple[int, Tuple[int, ...]]]:
+    return [(start, signature[start:start + _ROWS]) for start in range(0, _PERMUTATIONS, _ROWS)]
+
+
+def _similarity(a: Tuple[int, ...], b: Tuple[int, ...]) -> float:
+    # Share of matching slots estimates the Jaccard similarity of the feature sets
+    return sum(x == y for x, y in zip(a, b)) / _PERMUTATIONS
+
+
+class SimilarityCache:
+    """
+    Cross-session near-duplicate index for inbound scammer messages. Values
+    are stored under the message's MinHash signature; LSH bands find
+    candidates, which count as hits at an estimated Jaccard similarity of
+    `threshold` or more. Entries expire after `ttl` seconds and the least
+    recently used are evicted beyond `max_entries`.
+    """
+
+    def __init__(self, max_entries: int, ttl: float, threshold: float, min_words: int, enabled: bool = True):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.threshold = threshold
+        self.min_words = min_words
+        self.enabled = enabled and max_entries > 0
+        # entry id -> (signature, stored_at, value)
+        self._entries: "OrderedDict[int, Tuple[Tuple[int, ...], float, Dict]]" = OrderedDict()
+        self._buckets: Dict[Tuple[int, Tuple[int, ...]], Set[int]] = {}
+        self._ids = itertools.count()
+        self._lock = Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def _signature(self, text: str) -> Tuple[int, ...] | None:
+        words = _normalize(text or "")
+        if len(words) < self.min_words:
+            return None
+        return minhash(words)
+
+    def _remove(self, entry_id: int) -> None:
+        entry = self._entries.pop(entry_id, None)
+        if entry is None:
+            return
+        for key in _bands(entry[0]):
+            bucket = self._buckets.get(key)
+            if bucket is not None:
+                bucket.discard(entry_id)
+                if not bucket:
+                    del self._buckets[key]
+
+    def _best_match(self, signature: Tuple[int, ...], now: float) -> int | None:
+        candidates: Set[int] = set()
+        for key in _bands(signature):
+            candidates.update(self._buckets.get(key, ()))
+        best, best_score = None, self.threshold
+        for entry_id in candidates:
+            entry = self._entries.get(entry_id)
+            if entry is None:
+                continue
+            stored, stored_at, _ = entry
+            if self.ttl and now - stored_at > self.ttl:
+                self._remove(entry_id)
+                continue
+            score = _similarity(signature, stored)
+            if score >= best_score:
+                best, best_score = entry_id, score
+        return best
+
+    def get(self, text: str) -> Dict | None:
+        if not self.enabled:
+            return None
+        signature = self._signature(text)
+        if signature is None:
+            return None
+        with self._lock:
+            best = self._best_match(signature, time.monotonic())
+            if best is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(best)
+            self.hits += 1
+            return dict(self._entries[best][2])
+
+    def put(self, text: str, value: Dict) -> None:
+        if not self.enabled:
+            return
+        signature = self._signature(text)
+        if signature is None:
+            return
+        now = time.monotonic()
+        with self._lock:
+            # A fresh classification replaces the near-duplicate it matches
+            existing = self._best_match(signature, now)
+            if existing is not None:
+                self._remove(existing)
+            entry_id = next(self._ids)
+            self._entries[entry_id] = (signature, now, value)
+            for key in _bands(signature):
+                self._buckets.setdefault(key, set()).add(entry_id)
+            while len(self._entries) > self.max_entries:
+                self._remove(next(iter(self._entries)))
+
+    def metrics(self) -> Dict:
+        lookups = self.hits + self.misses
+        return {
+            "enabled": self.enabled,
+            "entries": len(self._entries),
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+        }
+
+
+SIMILARITY_CACHE = SimilarityCache(
+    SIMILARITY_CACHE_SIZE,
+    SIMILARITY_CACHE_TTL_SECONDS,
+    SIMILARITY_THRESHOLD,
+    SIMILARITY_MIN_WORDS,
+    enabled=SIMILARITY_CACHE_ENABLED,
+)
@@ -0,0 +1,37 @@
+import asyncio
+import hashlib
+import random
+import time
+
+from config import TYPING_DELAY_MIN_MS, TYPING_DELAY_MAX_MS, TYPING_DELAY_JITTER
+
+
+def _session_base_ms(session_id: str) -> float:
+    # Each session gets a stable "typing speed" inside the configured window
+    low = max(0, TYPING_DELAY_MIN_MS)
+    high = max(low, TYPING_DELAY_MAX_MS)
+    digest = hashlib.blake2b(session_id.encode("utf-8"), digest_size=2).digest()
+    fraction = int.from_bytes(digest, "big") / 0xFFFF
+    return low + (high - low) * fraction
+
+def typing_window(session_id: str) -> float:
+    """
+    Returns the total time (seconds) a turn should appear to take for this session.
+    """
+    base = _session_base_ms(session_id)
+    if base <= 0:
+        return 0.0
+    jitter = base * TYPING_DELAY_JITTER
+    return max(0.0, base + random.uniform(-jitter, jitter)) / 1000
+
+async def wait_for_typing_window(session_id: str, started_at: float) -> float:
+    """
+    Sleeps only for whatever is left of the session's window after the work
+    already done since `started_at` (time.monotonic()). Returns the slept time.
+    """
+    remaining = typing_window(session_id) - (time.monotonic() - started_at)
+    if remaining <= 0:
+        return 0.0
+    # asyncio.sleep yields the event loop, so the worker keeps serving other turns
+    await asyncio.sleep(remaining)
+    return remaining